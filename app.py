@@ -1,245 +1,346 @@
 # Importing the necessary libraries and packages
-import pandas as pd
+import os
+from functools import lru_cache, partial
+
 import numpy as np
 
 import dash
-from dash import dcc, html, Input, Output
+from dash import dcc, html, ctx, Input, Output, State, ClientsideFunction
+from flask import abort, request, has_request_context
 import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
-
-from io import BytesIO
-import base64
+from plotly.colors import n_colors, hex_to_rgb
 
 # Importing Custom functions
-from functions import make_density_df, get_data_geo, plot_wordcloud, split_long_label
-
-# Dataset read
-path = 'data/'
-df = pd.read_csv(path + 'merged.csv')
+from functions import make_density_from_counts, make_choropleth_cube, file_hash, word_frequencies
+from wordclouds import WordCloudCache, render_timeout, render_poll, render_settings
+from images import OptimizedImages
+from dataset import load_dataset
+from figure_cache import FigureCache
+from snapshots import FigureSnapshots
+from metrics import CallbackMetrics
+from compression import ResponseCompression, PrecompressedAssets
+from figures import make_figure, make_patch
+
+# Dataset read (typed columnar store, cached on disk and indexed by category and laureate type)
+dataset = load_dataset()
+df = dataset.df
+
+# With NOBEL_CLIENTSIDE_MAP=1 the choropleth is filtered in the browser from a preaggregated count cube
+clientside_map = os.environ.get('NOBEL_CLIENTSIDE_MAP', '0') == '1'
 
 # Pre-defining the options for selection menus
 category_options = ['All Categories', 'Physics', 'Chemistry', 'Medicine', 'Literature', 'Peace', 'Economics']
 default_category = "All Categories"
 science_options = ['All Sciences', 'Physics', 'Chemistry', 'Medicine', 'Economics']
 default_science = "All Sciences"
+default_scale = "Log Scale"
+# Whole range of the data, it grows when laureates of a new year are appended (see use_dataset)
+default_years = [int(dataset.years[0]), int(dataset.years[-1])]
+gender_options = [{'label': 'Women', 'value': 'female'}, {'label': 'Men', 'value': 'male'}, {'label': 'Organisations', 'value': 'org'}]
+default_genders = ['female', 'male', 'org']
+
+# Markers of the category by year scatter plot: aggregated, size (aggregated, sized by count) or points,
+# and the number of markers from which it is drawn with WebGL
+scatter_mode = os.environ.get('NOBEL_SCATTER_MODE', 'aggregated')
+scattergl_points = int(os.environ.get('NOBEL_SCATTERGL_POINTS', 5000))
+
+# Number of universities in the ranking, and the colors of the bars (darkest for the first place)
+top_universities = int(os.environ.get('NOBEL_TOP_UNIVERSITIES', 10))
+uni_colors = ['#E3B166', '#D6A359', '#C8964D', '#BA8941', '#AC7D36', '#9D7030', '#8F6529', '#805823', '#714B1C', '#623F17']
+if top_universities != len(uni_colors):
+    uni_colors = n_colors(hex_to_rgb(uni_colors[0]), hex_to_rgb(uni_colors[-1]), top_universities)
+    uni_colors = ['rgb({:.0f},{:.0f},{:.0f})'.format(*color) for color in uni_colors]
+
+# Options that change the figures (not only the data and the code), part of their cache version
+figure_options = '{}-{}-top{}'.format(scatter_mode, scattergl_points, top_universities)
+
+# Cached figures and images depend on the data, on the code that builds them and on the figure options
+source_files = [os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+                for name in ['app.py', 'functions.py', 'dataset.py', 'wordclouds.py', 'figures.py']]
+source_version = file_hash(*source_files)
+cache_version = dataset.version + '-' + source_version + '-' + figure_options
+
+# Callback outputs are pure functions of their inputs and the cache version
+figure_cache = FigureCache(cache_version)
+
+# Timing of the callbacks by phase, exposed on /metrics
+metrics = CallbackMetrics(figure_cache)
 
 ###########################
 #### Building Graphs ######
 ###########################
 
+#=================================
+#======= Word Cloud Cache ======== 
+#=================================
+
+def wordcloud_selection(chosen_category, chosen_years, chosen_genders):
+    # Genders in a fixed order, so that each selection has a single image URL
+    return (chosen_category, int(chosen_years[0]), int(chosen_years[1]),
+            tuple(gender for gender in default_genders if gender in chosen_genders))
+
+def motivation_frequencies(selection):
+    # Word counts of the motivations in the selection, summed from the term index of the dataset
+    chosen_category, first_year, last_year, genders = selection
+    category = None if chosen_category==default_category else chosen_category.lower()
+    counts = dataset.term_frequencies(category, (first_year, last_year), genders)
+    metrics.mark('filter')
+    frequencies = word_frequencies(dataset.terms, counts)
+    metrics.mark('aggregate')
+    return frequencies
+
+# Word clouds are rendered once per data version, render settings and selection, and shared on disk by all
+# workers. The seven default ones (all years and genders) are rendered at startup
+wordcloud_cache = WordCloudCache(dataset.version + '-' + source_version + '-' + render_settings)
+wordcloud_cache.warm([wordcloud_selection(c, default_years, default_genders) for c in category_options],
+                     motivation_frequencies)
+
 #=================================
 #======= Category Barchart ======= 
 #=================================
 
-category_labels = df['category'].value_counts()
-category_values = (category_labels / category_labels.sum()) * 100
-unique_category = df['category'].unique()
+def make_fig_bar_category():
+    category_labels = dataset.count(['category'])
+    category_values = (category_labels / category_labels.sum()) * 100
+    unique_category = category_labels.index
 
-data_bar_category = dict(type='bar',
-                        x=unique_category,
-                        y=category_values,
-                        marker=dict(color=[ '#623f17', '#ab6400', '#eb993c',  '#a57a50', '#e4a76c','#877769', '#a58a89' ]),
-                        hovertemplate='Category: %{x} <br>'+'Percentage: %{y}<br><extra></extra>'
-                        )
+    data_bar_category = dict(type='bar',
+                            x=unique_category,
+                            y=category_values,
+                            marker=dict(color=[ '#623f17', '#ab6400', '#eb993c',  '#a57a50', '#e4a76c','#877769', '#a58a89' ]),
+                            hovertemplate='Category: %{x} <br>'+'Percentage: %{y}<br><extra></extra>'
+                            )
 
-layout_bar_category = dict(title=dict(text='Prizes by Category'), 
-                           xaxis=dict(title='category'), 
-                           yaxis=dict(title='Percentage'),
-                           plot_bgcolor='#fcf2bf'
-                  )
+    layout_bar_category = dict(title=dict(text='Prizes by Category'), 
+                               xaxis=dict(title='category'), 
+                               yaxis=dict(title='Percentage'),
+                               plot_bgcolor='#fcf2bf'
+                      )
 
-fig_bar_category = go.Figure(data=[data_bar_category], layout=layout_bar_category)
+    fig_bar_category = go.Figure(data=[data_bar_category], layout=layout_bar_category)
+    return fig_bar_category
 
 #===============================
 #======= Sunburst Digram ======= 
 #===============================
 
-sunburst_df =  df.groupby(['category', 'gender'], as_index=False).size()
-sunburst_df['total'] = str(df.shape[0]) + ' Laureates'
-sunburst_df['laureate'] = sunburst_df['gender'].apply(lambda x: 'Organisation' if x=='org' else 'Individual')
-sunburst_df['category'] = sunburst_df['category'].apply(lambda x: x.capitalize())
-
-fig_sunburst = px.sunburst(sunburst_df, 
-                           path=['total', 'laureate', 'category'],  #path=['laureate', 'category'], 
-                           values='size',
-                           color = 'laureate',
-                           color_discrete_map={'(?)':'', 'Individual':'#eb993c', 'Organisation':'#877769'},
-                           #title="Laureate Types and Award Categories",
-                          )
-
-fig_sunburst.update_traces(hovertemplate="<b>%{label}:</b><br>%{value} Laureates<extra></extra>")
-#fig_sunburst.update_traces(insidetextorientation='horizontal')
-fig_sunburst.update_traces(leaf_opacity=0.6)
-fig_sunburst.update_traces(textfont_size=14)
-fig_sunburst.update_traces(textinfo="label+percent parent")
-fig_sunburst.update_layout(margin={"r":5,"t":30,"l":5,"b":0})
-
-fig_sunburst.update_layout(title={'text': 'Laureates and Categories', 
-                                  'font': {'family':"Helvetica Neue", 'color':'black'},
-                                   'y':0.95,
-                                   'x':0.5,
-                                   'xanchor': 'center',
-                                   'yanchor': 'top'})
+def make_fig_sunburst():
+    import plotly.express as px # imported on first use, it is slow to load
+    sunburst_df = dataset.count(['category', 'gender']).reset_index(name='size')
+    sunburst_df['total'] = str(dataset.count()) + ' Laureates'
+    sunburst_df['laureate'] = sunburst_df['gender'].apply(lambda x: 'Organisation' if x=='org' else 'Individual')
+    sunburst_df['category'] = sunburst_df['category'].astype(str).str.capitalize()
+
+    fig_sunburst = px.sunburst(sunburst_df, 
+                               path=['total', 'laureate', 'category'],  #path=['laureate', 'category'], 
+                               values='size',
+                               color = 'laureate',
+                               color_discrete_map={'(?)':'', 'Individual':'#eb993c', 'Organisation':'#877769'},
+                               #title="Laureate Types and Award Categories",
+                              )
+
+    fig_sunburst.update_traces(hovertemplate="<b>%{label}:</b><br>%{value} Laureates<extra></extra>")
+    #fig_sunburst.update_traces(insidetextorientation='horizontal')
+    fig_sunburst.update_traces(leaf_opacity=0.6)
+    fig_sunburst.update_traces(textfont_size=14)
+    fig_sunburst.update_traces(textinfo="label+percent parent")
+    fig_sunburst.update_layout(margin={"r":5,"t":30,"l":5,"b":0})
+
+    fig_sunburst.update_layout(title={'text': 'Laureates and Categories', 
+                                      'font': {'family':"Helvetica Neue", 'color':'black'},
+                                       'y':0.95,
+                                       'x':0.5,
+                                       'xanchor': 'center',
+                                       'yanchor': 'top'})
+    return fig_sunburst
 
 #===============================================
 #======= Scatter plot - Category by Year ======= 
 #===============================================
 
-x = df['year']
-y = df['category'].str.capitalize()
-size = df.shape[0]*[6]
-
-color_dict={'Physics':'#623f17', 'Chemistry':'#ab6400', 'Medicine':'#eb993c', 
-            'Literature':'#6cb436', 'Peace':'#6a93c9', 'Economics': '#c32794'}  
-color = [color_dict[i] for i in y]
-
-data_scatter = dict(type='scatter', x=x, y=y,
-                    marker_color=color,
-                    marker_opacity=1,
-                    mode='markers',
-                    marker=dict(size=size),
-                    hovertemplate="Category: %{y}<br>Year: %{x}<br><extra></extra>" ,
-                    showlegend=False)
-
-layout_scatter = dict(yaxis=dict(title='Category', gridwidth=2),
-                      xaxis=dict(title='Year', gridwidth=2), 
-                      plot_bgcolor='#fbe9d9')
-
-fig_scatter = go.Figure(data=data_scatter, layout=layout_scatter)
-fig_scatter.update_layout(margin={"r":20,"t":70,"l":35,"b":35})
-
-fig_scatter.update_layout(title={'text': 'Awarded Categories by Year', 
-                                  'font': {'family':"Helvetica Neue", 'color':'black'},
-                                   'y':0.95,
-                                   'x':0.5,
-                                   'xanchor': 'center',
-                                   'yanchor': 'top'})
+def make_fig_scatter():
+    # One marker per (year, category) with the number of laureates in the hover text, or one per laureate
+    # with NOBEL_SCATTER_MODE=points. With NOBEL_SCATTER_MODE=size the markers grow with the number of laureates
+    counts = dataset.count(['year', 'category']).reset_index()
+    if scatter_mode == 'points':
+        counts = df[['year', 'category']].assign(count=1)
+    x = counts['year']
+    y = counts['category'].astype(str).str.capitalize()
+    size = 6
+    if scatter_mode == 'size':
+        size = 4 + 2 * np.sqrt(counts['count'])
+
+    color_dict={'Physics':'#623f17', 'Chemistry':'#ab6400', 'Medicine':'#eb993c', 
+                'Literature':'#6cb436', 'Peace':'#6a93c9', 'Economics': '#c32794'}  
+    color = y.map(color_dict)
+
+    # WebGL is faster to draw than SVG from a few thousand markers on
+    data_scatter = dict(type='scattergl' if len(counts) > scattergl_points else 'scatter', x=x, y=y,
+                        customdata=counts['count'],
+                        marker_color=color,
+                        marker_opacity=1,
+                        mode='markers',
+                        marker=dict(size=size),
+                        hovertemplate="Category: %{y}<br>Year: %{x}<br>Laureates: %{customdata}<br><extra></extra>" ,
+                        showlegend=False)
+
+    layout_scatter = dict(yaxis=dict(title='Category', gridwidth=2),
+                          xaxis=dict(title='Year', gridwidth=2), 
+                          plot_bgcolor='#fbe9d9')
+
+    fig_scatter = go.Figure(data=data_scatter, layout=layout_scatter)
+    fig_scatter.update_layout(margin={"r":20,"t":70,"l":35,"b":35})
+
+    fig_scatter.update_layout(title={'text': 'Awarded Categories by Year', 
+                                      'font': {'family':"Helvetica Neue", 'color':'black'},
+                                       'y':0.95,
+                                       'x':0.5,
+                                       'xanchor': 'center',
+                                       'yanchor': 'top'})
+    return fig_scatter
 
 #========================================
 #======= Barchart: Gender by Year ======= 
 #========================================
 
-df['count'] = 1
-df['total'] = len(df['count'])
+def make_fig_bar_gender():
+    from plotly.subplots import make_subplots
+    df_gender_year = dataset.gender_by_year.reset_index()
 
-pivot_table = pd.pivot_table(df, values='count', index='year', columns='gender', aggfunc='count', fill_value = 0)
-df_gender_year = pivot_table.reset_index()
+    # Set the columns we want to our plot
+    year = df_gender_year['year']
+    female = df_gender_year['female']
+    male = df_gender_year['male']*(-1)
 
-# Set the columns we want to our plot
-year = df_gender_year['year']
-female = df_gender_year['female']
-male = df_gender_year['male']*(-1)
-
-fig_bar_gender = make_subplots(rows=1, cols=2, specs=[[{}, {}]], 
-                               shared_yaxes=True, horizontal_spacing=0,
-                               subplot_titles = ('Males', 'Females'))
+    fig_bar_gender = make_subplots(rows=1, cols=2, specs=[[{}, {}]], 
+                                   shared_yaxes=True, horizontal_spacing=0,
+                                   subplot_titles = ('Males', 'Females'))
   
-# Adding Male data to the figure
-fig_bar_gender.add_trace(go.Bar(y=year, x=male, 
-                         name='Male', orientation='h',
-                         marker=dict(color='#c66e00'),
-                         hovertemplate='Year: %{y} <br>'+'Males: %{x} <br><extra></extra>',
-                         ), 1, 1)
-
-# Adding Female data to the figure
-fig_bar_gender.add_trace(go.Bar(y=year, x=female,
-                         name='Female', 
-                         orientation='h',
-                         marker=dict(color='#a58a89'),
-                         hovertemplate='Year: %{y} <br>'+'Females: %{x} <br><extra></extra>',
-                         ), 1, 2)
+    # Adding Male data to the figure
+    fig_bar_gender.add_trace(go.Bar(y=year, x=male, 
+                             name='Male', orientation='h',
+                             marker=dict(color='#c66e00'),
+                             hovertemplate='Year: %{y} <br>'+'Males: %{x} <br><extra></extra>',
+                             ), 1, 1)
+
+    # Adding Female data to the figure
+    fig_bar_gender.add_trace(go.Bar(y=year, x=female,
+                             name='Female', 
+                             orientation='h',
+                             marker=dict(color='#a58a89'),
+                             hovertemplate='Year: %{y} <br>'+'Females: %{x} <br><extra></extra>',
+                             ), 1, 2)
     
-# Updating the layout for our graph
-fig_bar_gender.update_layout(#title='Annual Number of Awarded Individuals, split by Gender',
-                 title_x=0.5, title_y = 0,
-                 barmode = 'overlay',
-                 bargap = 0.2, bargroupgap = 0,
-                 xaxis = dict(tickmode = 'array',
-                              tickvals = [-14, -13, -12, -11, -10, -9, -8, -7, -6, -5, -4, -3, -2, -1],
-                              ticktext = [14, 13, 12, 11, 10, 9, 8, 7, 6, 5, 4, 3, 2, 1],
-                            ),
-                xaxis2 = dict(range=[0, 14],
-                              tickvals = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14],
-                              ticktext = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14],
-                            ),
+    # Updating the layout for our graph
+    fig_bar_gender.update_layout(#title='Annual Number of Awarded Individuals, split by Gender',
+                     title_x=0.5, title_y = 0,
+                     barmode = 'overlay',
+                     bargap = 0.2, bargroupgap = 0,
+                     xaxis = dict(tickmode = 'array',
+                                  tickvals = [-14, -13, -12, -11, -10, -9, -8, -7, -6, -5, -4, -3, -2, -1],
+                                  ticktext = [14, 13, 12, 11, 10, 9, 8, 7, 6, 5, 4, 3, 2, 1],
+                                ),
+                    xaxis2 = dict(range=[0, 14],
+                                  tickvals = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14],
+                                  ticktext = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14],
+                                ),
 
-                yaxis=dict(#side='right',
-                           tickvals = [1901, 1911, 1921, 1931, 1941, 1951, 1961, 1971, 1981, 1991, 2001, 2011, 2021],
-                           ticktext = [1901, 1911, 1921, 1931, 1941, 1951, 1961, 1971, 1981, 1991, 2001, 2011, 2021],
-                           autorange="reversed"
-                        ),
-                plot_bgcolor='#fbe9d9',
-                showlegend=False,
-                )
+                    yaxis=dict(#side='right',
+                               tickvals = [1901, 1911, 1921, 1931, 1941, 1951, 1961, 1971, 1981, 1991, 2001, 2011, 2021],
+                               ticktext = [1901, 1911, 1921, 1931, 1941, 1951, 1961, 1971, 1981, 1991, 2001, 2011, 2021],
+                               autorange="reversed"
+                            ),
+                    plot_bgcolor='#fbe9d9',
+                    showlegend=False,
+                    )
 
-fig_bar_gender.update_layout(margin={"r":20,"t":35,"l":20,"b":15})
+    fig_bar_gender.update_layout(margin={"r":20,"t":35,"l":20,"b":15})
 
-# Create a horizontal highlight section
-fig_bar_gender.add_hrect(y0=1939, y1=1945, row=1, col=1,
-                fillcolor="Grey", opacity=0.25)
+    # Create a horizontal highlight section
+    fig_bar_gender.add_hrect(y0=1939, y1=1945, row=1, col=1,
+                    fillcolor="Grey", opacity=0.25)
 
-fig_bar_gender.add_hrect(y0=1939, y1=1945, row=1, col=2,
-                annotation_text="II World War", annotation_position='right',  
-                annotation_font_size=12,
-                annotation_font_color="Black",
-                fillcolor="Grey", opacity=0.25)
+    fig_bar_gender.add_hrect(y0=1939, y1=1945, row=1, col=2,
+                    annotation_text="II World War", annotation_position='right',  
+                    annotation_font_size=12,
+                    annotation_font_color="Black",
+                    fillcolor="Grey", opacity=0.25)
+    return fig_bar_gender
 
 #==============================
 #======= Choropleth Map ======= 
 #==============================
-df_density = make_density_df(df)
-
-data_choropleth = dict(type='choropleth',
-                        locations=df_density['iso-a3'],
-                        autocolorscale = False,
-                        z=np.log(df_density['count']),
-                        zmin=np.log(df_density['count'].min()),
-                        zmax=np.log(df_density['count'].max()),
-                        colorscale = ["#fcf2bf", "#ab6400"],   
-                        marker_line_color = '#674e04',
-                        colorbar=dict(title='Total Prizes(log)'),
-                        text=df_density['name'],
-                        hovertemplate='Country: %{text} <br>'+'Prizes (log): %{z} <br><extra></extra>',
-                        )
+
+def make_fig_choropleth():
+    df_density = make_density_from_counts(dataset.count(['country']).rename_axis('bornCountryCode').to_frame())
+
+    data_choropleth = dict(type='choropleth',
+                            locations=df_density['iso-a3'],
+                            autocolorscale = False,
+                            z=np.log(df_density['count']),
+                            zmin=np.log(df_density['count'].min()),
+                            zmax=np.log(df_density['count'].max()),
+                            colorscale = ["#fcf2bf", "#ab6400"],   
+                            marker_line_color = '#674e04',
+                            colorbar=dict(title='Total Prizes(log)'),
+                            text=df_density['name'],
+                            hovertemplate='Country: %{text} <br>'+'Prizes (log): %{z} <br><extra></extra>',
+                            )
                     
-layout_choropleth = dict(geo=dict(projection={'type': 'natural earth'}, 
-                         bgcolor= 'rgba(0,0,0,0)'))
+    layout_choropleth = dict(geo=dict(projection={'type': 'natural earth'}, 
+                             bgcolor= 'rgba(0,0,0,0)'))
 
-fig_choropleth = go.Figure(data=data_choropleth, layout=layout_choropleth)
-fig_choropleth.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
-fig_choropleth.update_geos(showcoastlines=False)
+    fig_choropleth = go.Figure(data=data_choropleth, layout=layout_choropleth)
+    fig_choropleth.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
+    fig_choropleth.update_geos(showcoastlines=False)
+    return fig_choropleth
 
 #=======================================
 #======= Barchart - Universities ======= 
 #=======================================
 
-df['uni_full'] = df['name'] +', ' +df['country'] 
-top = df['uni_full'].value_counts().head(10)
-data = {'values': top.index[::-1], 'counts': top.values[::-1]}
-df_top = pd.DataFrame(data)
-
-# Splitting column into two columns based on comma separation
-df_top[['University', 'Country']] = df_top['values'].str.split(',', expand=True)
-df_top.drop('values', axis=1, inplace=True) # dropping the original column 
-
-data_bar_uni = dict(type='bar',
-                    x=df_top['counts'],
-                    y=df_top['University'],
-                    text=df_top['Country'],
-                    orientation='h',
-                    marker=dict(color=['#E3B166', '#D6A359', '#C8964D', '#BA8941', '#AC7D36', 
-                                       '#9D7030', '#8F6529', '#805823', '#714B1C', '#623F17']),
-                    hovertemplate='%{y}, %{text}<br>'+'Laureates: %{x}<br><extra></extra>',
-                    )
+def make_fig_bar_uni():
+    # Same ranking and colors as the callback for all sciences (see get_top_uni)
+    df_top = dataset.top_universities(None, top_universities).iloc[::-1] # the largest bar on top
 
-layout_bar_uni = dict(#xaxis=dict(title='Number of Laureates'), 
-                      #yaxis=dict(title='University'),
-                      plot_bgcolor='#fbe9d9')
+    data_bar_uni = dict(type='bar',
+                        x=df_top['counts'],
+                        y=df_top['label'], # long names split into lines
+                        text=df_top['Country'],
+                        orientation='h',
+                        marker=dict(color=uni_colors),
+                        hovertemplate='%{y}, %{text}<br>'+'Laureates: %{x}<br><extra></extra>',
+                        )
 
-fig_bar_uni = go.Figure(data=[data_bar_uni], layout=layout_bar_uni)
+    layout_bar_uni = dict(#xaxis=dict(title='Number of Laureates'), 
+                          #yaxis=dict(title='University'),
+                          plot_bgcolor='#fbe9d9')
 
-fig_bar_uni.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
+    fig_bar_uni = go.Figure(data=[data_bar_uni], layout=layout_bar_uni)
+
+    fig_bar_uni.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
+    return fig_bar_uni
+
+
+#=============================================
+#======= Histogram - Age (layout only) ======= 
+#=============================================
+
+# Same layout as plotly express uses for a histogram with a marginal box plot. The page starts with it,
+# and the callback only sends the traces of the chosen category
+layout_hist_age = dict(xaxis=dict(anchor='y', domain=[0.0, 1.0], title=dict(text='Age')),
+                       yaxis=dict(anchor='x', domain=[0.0, 0.7326], title=dict(text='Number of Laureates')),
+                       xaxis2=dict(anchor='y2', domain=[0.0, 1.0], matches='x', showticklabels=False, showgrid=True),
+                       yaxis2=dict(anchor='x2', domain=[0.7426, 1.0], showticklabels=False, showline=False,
+                                   ticks='', showgrid=False),
+                       barmode='relative',
+                       bargap=0,
+                       plot_bgcolor='rgba(0,0,0,0)',
+                       legend=dict(title=dict(text=''), tracegroupgap=0, x=1, y=0.5, itemclick='toggleothers'),
+                       margin={"r":20,"t":50,"l":20,"b":20})
+
+def make_fig_hist_age():
+    return go.Figure(layout=layout_hist_age)
 
 
 ##########################
@@ -250,304 +351,379 @@ app = dash.Dash(__name__)
 server = app.server
 app.title = "Nobel Prize Winners"
 
-app.layout =  html.Div([
-    # Header DIV
-     html.Div(
-            [
-                html.Div(
-                    [
-                        html.Img(
-                            src=app.get_asset_url("Nova_IMS.png"),
-                            id="novaims-image",
-                            style={
-                                "height": "60px",
-                                "width": "auto",
-                                "margin-bottom": "20px",
-                                "float": "left",
-                                "margin-left":"-17.333333%"
-                            },
-                        )
-                    ],
-                    className="two columns bare_container", style={"float": "left"}
-                ),
+# Callback and layout JSON, the page and the Dash bundles are compressed when the client accepts it
+response_compression = ResponseCompression()
+server.after_request(response_compression.after_request)
+
+# Prometheus metrics of the callbacks of this worker. Flask runs the after_request hooks in reverse order, so
+# the metrics see the uncompressed response and the compression is not counted in the serialize phase
+server.route('/metrics')(metrics.response)
+server.after_request(metrics.after_request)
+
+# Assets are served from precompressed copies (written by build.py), the layout links them with their version
+assets = PrecompressedAssets(app.config.assets_folder)
+assets_endpoint = next(rule.endpoint for rule in server.url_map.iter_rules() if rule.endpoint.endswith('dash_assets.static'))
+server.view_functions[assets_endpoint] = lambda filename: assets.response(filename, request)
+
+def asset_url(name):
+    return app.get_asset_url(name) + '?v=' + assets.version(name)
+
+# Word clouds are served as cacheable static images instead of inline data URIs
+@server.route('/wordcloud/<slug>.png')
+def serve_wordcloud(slug):
+    selection = WordCloudCache.parse(slug)
+    if (selection is None or selection[0] not in category_options
+            or selection != wordcloud_selection(selection[0], selection[1:3], selection[3])
+            or not default_years[0] <= selection[1] <= selection[2] <= default_years[1]):
+        abort(404)
+    return wordcloud_cache.response(selection, request,
+                                    fallback=wordcloud_selection(selection[0], default_years, default_genders))
+
+# The US-share diagrams are served as WebP copies at display resolution (built once, see images.py)
+us_images = OptimizedImages([science + '_US_' for science in science_options])
+us_image_slugs = {OptimizedImages.slug(name): name for name in us_images.versions}
+
+@server.route('/images/<slug>.webp')
+def serve_us_image(slug):
+    if slug not in us_image_slugs:
+        abort(404)
+    return us_images.response(us_image_slugs[slug], request)
+
+# Static figures, loaded from the prebuilt snapshots (see build.py) or built once when the data, the code
+# or the figure options have changed
+snapshots = FigureSnapshots(cache_version)
+static_figures = {'fig_sunburst': make_fig_sunburst,
+                  'fig_scatter': make_fig_scatter,
+                  'fig_bar_gender': make_fig_bar_gender,
+                  'fig_choropleth': make_fig_choropleth,
+                  'fig_bar_uni': make_fig_bar_uni,
+                  'fig_hist_age': make_fig_hist_age,
+                  'choropleth_cube': lambda: make_choropleth_cube(dataset)}
+
+def static(name):
+    # Dash also calls serve_layout at import time to validate the callbacks, the static figures
+    # are only loaded when a page is actually requested
+    if not has_request_context():
+        return None
+    seed_callback_snapshots()
+    return snapshots.get(name, static_figures[name])
+
+
+# The layout is served as a function, so that worker startup does not build the static figures
+def serve_layout():
+    return html.Div([
+        # Header DIV
+         html.Div(
+                [
+                    html.Div(
+                        [
+                            html.Img(
+                                src=asset_url("Nova_IMS.png"),
+                                id="novaims-image",
+                                style={
+                                    "height": "60px",
+                                    "width": "auto",
+                                    "margin-bottom": "20px",
+                                    "float": "left",
+                                    "margin-left":"-17.333333%"
+                                },
+                            )
+                        ],
+                        className="two columns bare_container", style={"float": "left"}
+                    ),
 
-                html.Div(
-                    [
-                        html.Div(
-                            [
-                                html.H4(
-                                    "Nobel Prize Winners (1901-2022)",
-                                    style={"font-weight": "bold"},
-                                ),
-                                html.H5(
-                                    "Exploring historical data on the world’s most coveted award", style={"margin-top": "0px"}
-                                ),
-                            ]
-                        )
-                    ],
-                    className="sixish columns bare_container",
-                    id="title",
-                ),
+                    html.Div(
+                        [
+                            html.Div(
+                                [
+                                    html.H4(
+                                        "Nobel Prize Winners ({}-{})".format(*default_years),
+                                        style={"font-weight": "bold"},
+                                    ),
+                                    html.H5(
+                                        "Exploring historical data on the world’s most coveted award", style={"margin-top": "0px"}
+                                    ),
+                                ]
+                            )
+                        ],
+                        className="sixish columns bare_container",
+                        id="title",
+                    ),
 
-                html.Div(
-                    [
-                        html.Img(
-                            src=app.get_asset_url("Nobel_Prize.png"),
-                            id="nobel-image",
-                            style={
-                                "height": "70px",
-                                "width": "auto",
-                                "margin-bottom": "20px",
-                                "float": "right",
-                                #"margin-right":"-17.333333%"
-                            },
-                        )
-                    ],
-                    className="two columns bare_container", style={ "float": "right"}
-                ),
-            ],
-            id="header",
-            className="row",
-            style={"margin-bottom": "20px"},
-        ), # Header Div --end
-
-
-    # Main body DIV
-    html.Div([
-        html.Div(
-            [
-                html.P("The Nobel Prize is an international award administered by the Nobel Foundation in Stockholm, Sweden, and based on the fortune of Alfred Nobel, Swedish inventor and entrepreneur. In 1968, Sveriges Riksbank established The Sveriges Riksbank Prize in Economic Sciences in Memory of Alfred Nobel. Each prize consists of a medal, a personal diploma, and a cash award.", 
-                    className="control_label",style={"text-align": "justify"}),
-            ],
-            className="row pretty_container",
-        ),
-
-        #General Nobel Prize information
-        html.Div(
-            [
-                html.H6("General Nobel Prize Information", style={"margin-top": "0","font-weight": "bold","text-align": "center"}),
-                html.Div([dcc.Graph(id="fig_sunburst", figure=fig_sunburst)], className="pretty_container four columns"),
+                    html.Div(
+                        [
+                            html.Img(
+                                src=asset_url("Nobel_Prize.png"),
+                                id="nobel-image",
+                                style={
+                                    "height": "70px",
+                                    "width": "auto",
+                                    "margin-bottom": "20px",
+                                    "float": "right",
+                                    #"margin-right":"-17.333333%"
+                                },
+                            )
+                        ],
+                        className="two columns bare_container", style={ "float": "right"}
+                    ),
+                ],
+                id="header",
+                className="row",
+                style={"margin-bottom": "20px"},
+            ), # Header Div --end
+
+
+        # Main body DIV
+        html.Div([
+            html.Div(
+                [
+                    html.P("The Nobel Prize is an international award administered by the Nobel Foundation in Stockholm, Sweden, and based on the fortune of Alfred Nobel, Swedish inventor and entrepreneur. In 1968, Sveriges Riksbank established The Sveriges Riksbank Prize in Economic Sciences in Memory of Alfred Nobel. Each prize consists of a medal, a personal diploma, and a cash award.", 
+                        className="control_label",style={"text-align": "justify"}),
+                ],
+                className="row pretty_container",
+            ),
+
+            #General Nobel Prize information
+            html.Div(
+                [
+                    html.H6("General Nobel Prize Information", style={"margin-top": "0","font-weight": "bold","text-align": "center"}),
+                    html.Div([dcc.Graph(id="fig_sunburst", figure=static('fig_sunburst'))], className="pretty_container four columns"),
                 
-                html.Div([
-                    html.Div(style={'margin-top': 20}),
-                    dcc.Markdown("A person or organisation awarded the Nobel Prize is called Nobel Prize **laureate**. Between 1901 and 2022, 615 Nobel Prizes were awarded to 989 laureates."),
-                    html.P("The Nobel Prize recognises the highest achievement in six categories: Medicine, Physics, Chemistry, Literature, Peace,  Economics"),
-                    
-                    html.Div(style={'margin-top': 20}),
                     html.Div([
-                        html.P("Motivation for the Award", 
-                                style={"font-weight": "bold","text-align": "center"}),
-                        html.P("The cloud of words below outlines which words appear more frequently in the textual motivation for the Nobel Prize awards:"),
                         html.Div(style={'margin-top': 20}),
-                        html.Div([html.Img(id="image_wordcloud", style={'position':'relative', 'width':'100%'})],
-                                className="eight columns bare_container"),
-                        html.Div(
-                            [
-                                dcc.RadioItems(
-                                    id='radio_category_general',
-                                    options= category_options,
-                                    value=default_category,
-                                    labelStyle={'display':'block'},
-                                    ),
-                            ],className="three columns bare_container"
-                        ), 
-                    ], className="mini_container twelve columns",),
-
-                    ], className="container sixish columns"
-                ),
-                html.Div([dcc.Graph(id="fig_scatter", figure=fig_scatter)], 
-                className="bare_container eleven columns"),
-            ],
-            className="row pretty_container",
-        ),
+                        dcc.Markdown("A person or organisation awarded the Nobel Prize is called Nobel Prize **laureate**. Between {} and {}, {} Nobel Prizes were awarded to {} laureates.".format(*default_years, len(dataset.count(['year', 'category'])), dataset.count())),
+                        html.P("The Nobel Prize recognises the highest achievement in six categories: Medicine, Physics, Chemistry, Literature, Peace,  Economics"),
+                    
+                        html.Div(style={'margin-top': 20}),
+                        html.Div([
+                            html.P("Motivation for the Award", 
+                                    style={"font-weight": "bold","text-align": "center"}),
+                            html.P("The cloud of words below outlines which words appear more frequently in the textual motivation for the Nobel Prize awards (in the years selected on the map below):"),
+                            html.Div(style={'margin-top': 20}),
+                            html.Div([html.Img(id="image_wordcloud", style={'position':'relative', 'width':'100%'}),
+                                      # Checks for a word cloud that is being rendered, enabled by make_image
+                                      dcc.Interval(id='wordcloud-poll', interval=1000 * render_poll, disabled=True)],
+                                    className="eight columns bare_container"),
+                            html.Div(
+                                [
+                                    dcc.RadioItems(
+                                        id='radio_category_general',
+                                        options= category_options,
+                                        value=default_category,
+                                        labelStyle={'display':'block'},
+                                        ),
+                                    html.Div(style={'margin-top': 20}),
+                                    dcc.Checklist(
+                                        id='checklist_gender_general',
+                                        options=gender_options,
+                                        value=default_genders,
+                                        labelStyle={'display':'block'},
+                                        ),
+                                ],className="three columns bare_container"
+                            ), 
+                        ], className="mini_container twelve columns",),
 
-        # Demographic information
-        html.Div([
-            html.H5("Demographic Information about Individual Laureates", style={"margin-top": "0","font-weight": "bold","text-align": "center"}), 
-            # Gender Info Div
-            html.Div([
-                html.H6("Genders of the Nobel Prize Laureates", 
-                        style={"margin-top": "0","text-align": "center"}),
-                html.Div([dcc.Graph(id="fig_bar_gender", figure=fig_bar_gender)], 
-                                    className ="eight columns pretty_container"),
-                html.Div([
-                    html.Div(style={'margin-top': 20}),
-                    html.P("Insights on Gender Figures:", style={"font-weight":"bold"}),
-                    html.P("- More than 90 percent of Nobel Prize winners have been men."),
-                    html.P("- Last year, in 2022, two out of the fourteen Nobel laureates were women."),
-                    html.P("- The graph illustrates annual number of the awarded individuals split by gender. As can be seen, the situation with gender disproportion becomes a bit better with the time."),
-                    html.P("- One more thing is noticeable on the graph - the gap in the 1940-th. It turned out, during the Second World War, no Nobel Peace Prize was awarded.")
-                    ], className ="three columns"),
+                        ], className="container sixish columns"
+                    ),
+                    html.Div([dcc.Graph(id="fig_scatter", figure=static('fig_scatter'))], 
+                    className="bare_container eleven columns"),
                 ],
-                className ="twelve columns pretty_container"
+                className="row pretty_container",
             ),
-  
-            # Age Info Div
+
+            # Demographic information
             html.Div([
-                html.H6("Ages of the Nobel Prize Laureates", style={"margin-top":"50","text-align": "center"}),
+                html.H5("Demographic Information about Individual Laureates", style={"margin-top": "0","font-weight": "bold","text-align": "center"}), 
+                # Gender Info Div
                 html.Div([
-                    dcc.Graph(id="fig_hist_age")], className="eight columns pretty_container"       
-                    ),
-                ]),
-                html.Div([
-                    html.Div(style={'margin-top': 20}),
-                    html.Div(
-                        [   
-                            html.P("Maximum Age",style={"text-align": "center","font-weight":"bold"}),
-                            html.P(id="max_age",style={"text-align": "center"}),
-                            html.P(id="max_name",style={"text-align": "center"}),
-                            html.P(id="max_year",style={"text-align": "center"}),
-                            html.P(id="max_category",style={"text-align": "center"}),
-                        ],
-                        className="mini_container",
-                        id="max_age_container",
-                    ),
-                    html.Div(style={'margin-top': 30}),
-                    html.Div(
-                        [
-                            html.P("Minimum Age",style={"text-align": "center","font-weight":"bold"}),
-                            html.P(id="min_age",style={"text-align": "center"}),
-                            html.P(id="min_name",style={"text-align": "center"}),
-                            html.P(id="min_year",style={"text-align": "center"}),
-                            html.P(id="min_category",style={"text-align": "center"}),
-                        ],
-                        className="mini_container",
-                        id="min_age_container",
-                    ),
-                    ], className="three columns",
-                ),
-                html.Div([
-                    html.P(),
-                    #html.P("Select Research Category:", className="control_label",style={"text-align": "center","font-weight":"bold"}),
-                    dcc.RadioItems(
-                                id='radio_category',
-                                options= category_options,
-                                value=default_category,
-                                labelStyle={'display': 'inline',}     
-                            ),
+                    html.H6("Genders of the Nobel Prize Laureates", 
+                            style={"margin-top": "0","text-align": "center"}),
+                    html.Div([dcc.Graph(id="fig_bar_gender", figure=static('fig_bar_gender'))], 
+                                        className ="eight columns pretty_container"),
+                    html.Div([
+                        html.Div(style={'margin-top': 20}),
+                        html.P("Insights on Gender Figures:", style={"font-weight":"bold"}),
+                        html.P("- More than 90 percent of Nobel Prize winners have been men."),
+                        html.P("- Last year, in 2022, two out of the fourteen Nobel laureates were women."),
+                        html.P("- The graph illustrates annual number of the awarded individuals split by gender. As can be seen, the situation with gender disproportion becomes a bit better with the time."),
+                        html.P("- One more thing is noticeable on the graph - the gap in the 1940-th. It turned out, during the Second World War, no Nobel Peace Prize was awarded.")
+                        ], className ="three columns"),
                     ],
-                    className="eight columns",
-                    style={"text-align": "center"},
+                    className ="twelve columns pretty_container"
                 ),
-                #html.Div(style={'margin-top': 50}),
-            ], className="row pretty_container"),
-
-        # Geographical Distribution of Nobel Prizes Winners
-        html.Div(
-            [
-                html.H6("Home Countries of Nobel Prizes Winners", style={"margin-top": "0","font-weight": "bold","text-align": "center"}),     
+  
+                # Age Info Div
                 html.Div([
-                    # Div containing choropleth graph
+                    html.H6("Ages of the Nobel Prize Laureates", style={"margin-top":"50","text-align": "center"}),
                     html.Div([
+                        dcc.Graph(id="fig_hist_age", figure=static('fig_hist_age'))], className="eight columns pretty_container"       
+                        ),
+                    ]),
+                    html.Div([
+                        html.Div(style={'margin-top': 20}),
                         html.Div(
-                            [dcc.Graph(id='choropleth-graph', figure=fig_choropleth)],
-                            className="pretty_container",
+                            [   
+                                html.P("Maximum Age",style={"text-align": "center","font-weight":"bold"}),
+                                html.P(id="max_age",style={"text-align": "center"}),
+                                html.P(id="max_name",style={"text-align": "center"}),
+                                html.P(id="max_year",style={"text-align": "center"}),
+                                html.P(id="max_category",style={"text-align": "center"}),
+                            ],
+                            className="mini_container",
+                            id="max_age_container",
                         ),
-                        html.Div(style={'margin-top': 50}), 
-                        dcc.RangeSlider(min=1901, max=2022, value=[1901, 2022], 
-                                    marks={ 1901: '1901', 1910: '1910', 1920: '1920',  1930: '1930',
-                                            1940: '1940', 1950: '1950', 1960: '1960',  1970: '1970',
-                                            1980: '1980', 1990: '1990', 2000: '2000',  2010: '2010',
-                                            2020: '2020',},
-                                    tooltip={"always_visible": True}, 
-                                    id='year-range-slider',
-                                    #className ="eleven columns" 
-                                    ),
-                    ], className="nine columns",
-                    ),
-
-                    # Div containg selection options for Scale and Award Category
-                    html.Div(
-                        [   
-                        html.Div([
-                            html.P("Select Scale", className="control_label",style={"text-align":"left","font-weight":"bold"}),
-                            dcc.RadioItems(id='scale-type',
-                                options=[{'label': i, 'value': i} for i in ['Log Scale', 'Absolute Count']],
-                                value='Log Scale',
-                                labelStyle={'display':'block'},
-                            ), 
-                            ], className="mini_container two columns",
+                        html.Div(style={'margin-top': 30}),
+                        html.Div(
+                            [
+                                html.P("Minimum Age",style={"text-align": "center","font-weight":"bold"}),
+                                html.P(id="min_age",style={"text-align": "center"}),
+                                html.P(id="min_name",style={"text-align": "center"}),
+                                html.P(id="min_year",style={"text-align": "center"}),
+                                html.P(id="min_category",style={"text-align": "center"}),
+                            ],
+                            className="mini_container",
+                            id="min_age_container",
                         ),
-                        html.Div([
-                            html.P("Select Category", className="control_label",style={"text-align":"left","font-weight":"bold"}),
-                            dcc.RadioItems(id='category-type',
-                                options=category_options,
-                                value=default_category,
-                                labelStyle={'display':'block'},
-                                ),
-                            ], className="mini_container two columns",
-                        ), 
-                        ], #className="two columns bare_container", 
-                    )
-                ],className="row"),
-            ],
-            className="row pretty_container",
-        ),
-
-        # Schooling Section
-        html.Div(
-            [
-                html.H6("Laureates' School Information", style={"margin-top": "0","font-weight": "bold","text-align": "center"}),
-                html.Div(
-                    [
-                    html.P("Top 10 Universities in the World", 
-                            style={"font-weight": "bold", "text-align": "left", "margin-left": 70}),
-
-                    html.Div([dcc.Graph(id="fig_bar_uni", figure=fig_bar_uni)], className="pretty_container"),
-                    html.Div(style={'margin-top': 30}),
+                        ], className="three columns",
+                    ),
                     html.Div([
+                        html.P(),
+                        #html.P("Select Research Category:", className="control_label",style={"text-align": "center","font-weight":"bold"}),
                         dcc.RadioItems(
-                                    id='radio_science',
-                                    options=[x for x in science_options],
-                                    value=default_science,
-                                    labelStyle={"display": "inline"}    
+                                    id='radio_category',
+                                    options= category_options,
+                                    value=default_category,
+                                    labelStyle={'display': 'inline',}     
                                 ),
                         ],
+                        className="eight columns",
                         style={"text-align": "center"},
                     ),
-                    html.Div(style={"margin-top": 30}),
-                    ],className="bare_container eleven columns"),
+                    #html.Div(style={'margin-top': 50}),
+                ], className="row pretty_container"),
 
+            # Geographical Distribution of Nobel Prizes Winners
+            html.Div(
+                [
+                    html.H6("Home Countries of Nobel Prizes Winners", style={"margin-top": "0","font-weight": "bold","text-align": "center"}),     
+                    html.Div([
+                        # Div containing choropleth graph
+                        html.Div([
+                            html.Div(
+                                [dcc.Graph(id='choropleth-graph', figure=static('fig_choropleth'))] +
+                                ([dcc.Store(id='choropleth-cube', data=static('choropleth_cube'))] if clientside_map else []),
+                                className="pretty_container",
+                            ),
+                            html.Div(style={'margin-top': 50}), 
+                            dcc.RangeSlider(min=default_years[0], max=default_years[1], value=default_years, 
+                                        marks={year: str(year) for year in range(default_years[0], default_years[1] + 1)
+                                               if year == default_years[0] or year % 10 == 0},
+                                        tooltip={"always_visible": True}, 
+                                        id='year-range-slider',
+                                        #className ="eleven columns" 
+                                        ),
+                        ], className="nine columns",
+                        ),
+
+                        # Div containg selection options for Scale and Award Category
+                        html.Div(
+                            [   
+                            html.Div([
+                                html.P("Select Scale", className="control_label",style={"text-align":"left","font-weight":"bold"}),
+                                dcc.RadioItems(id='scale-type',
+                                    options=[{'label': i, 'value': i} for i in ['Log Scale', 'Absolute Count']],
+                                    value=default_scale,
+                                    labelStyle={'display':'block'},
+                                ), 
+                                ], className="mini_container two columns",
+                            ),
+                            html.Div([
+                                html.P("Select Category", className="control_label",style={"text-align":"left","font-weight":"bold"}),
+                                dcc.RadioItems(id='category-type',
+                                    options=category_options,
+                                    value=default_category,
+                                    labelStyle={'display':'block'},
+                                    ),
+                                ], className="mini_container two columns",
+                            ), 
+                            ], #className="two columns bare_container", 
+                        )
+                    ],className="row"),
+                ],
+                className="row pretty_container",
+            ),
 
-                html.P("The Flow of Laureates to the US-based Schools", className="bare_container columns",
-                       style={"font-weight": "bold", "text-align": "left", "margin-left": 100}), 
+            # Schooling Section
+            html.Div(
+                [
+                    html.H6("Laureates' School Information", style={"margin-top": "0","font-weight": "bold","text-align": "center"}),
+                    html.Div(
+                        [
+                        html.P("Top {} Universities in the World".format(top_universities), 
+                                style={"font-weight": "bold", "text-align": "left", "margin-left": 70}),
 
-                html.Div(id="circle_US",   
-                        style={
-                                'width': '50%',  # set the width of the Div
-                                'padding-bottom': '50%',  # set the height of the Div to be the same as the width (i.e., 1:1 aspect ratio)
-                                'position': 'relative'  # set position to relative so that the child elements can be positioned absolutely
-                            },
-                        className="pretty_container five columns", 
+                        html.Div([dcc.Graph(id="fig_bar_uni", figure=static('fig_bar_uni'))], className="pretty_container"),
+                        html.Div(style={'margin-top': 30}),
+                        html.Div([
+                            dcc.RadioItems(
+                                        id='radio_science',
+                                        options=[x for x in science_options],
+                                        value=default_science,
+                                        labelStyle={"display": "inline"}    
+                                    ),
+                            ],
+                            style={"text-align": "center"},
                         ),
+                        html.Div(style={"margin-top": 30}),
+                        ],className="bare_container eleven columns"),
 
-                html.Div([
-                    html.Div(style={'margin-top': 20}),
-                    html.P("Insights on Geographical Distribution:", style={"font-weight":"bold"}),
-                    html.P(),
-                    html.P("- Individuals who were born in the USA become the Nobel Prize Laureates more often than those who were born in other countries. \
+
+                    html.P("The Flow of Laureates to the US-based Schools", className="bare_container columns",
+                           style={"font-weight": "bold", "text-align": "left", "margin-left": 100}), 
+
+                    html.Div([
+                                html.Img(id="image_US",
+                                         style={'position': 'absolute', 'top': 0, 'left': 0,
+                                                'width': '100%', 'height': '100%',
+                                                'object-fit': 'contain', 'object-position': 'left top',
+                                                'background-color': 'white'}),
+                            ],
+                            id="circle_US",   
+                            style={
+                                    'width': '50%',  # set the width of the Div
+                                    'padding-bottom': '50%',  # set the height of the Div to be the same as the width (i.e., 1:1 aspect ratio)
+                                    'position': 'relative'  # set position to relative so that the child elements can be positioned absolutely
+                                },
+                            className="pretty_container five columns", 
+                            ),
+
+                    html.Div([
+                        html.Div(style={'margin-top': 20}),
+                        html.P("Insights on Geographical Distribution:", style={"font-weight":"bold"}),
+                        html.P(),
+                        html.P("- Individuals who were born in the USA become the Nobel Prize Laureates more often than those who were born in other countries. \
                               (The exact total figures and figures for each nominated category, can be explored using the map above)."),
-                    html.P(),
-                    html.P("- The top performing universities in terms of winning the Nobel Prize for their research are also based in the USA. It is true throughout all the scientific categories of the Award: Physics, Chemistry, Medicine, and Economics."),
-                    html.P(),
-                    html.P("- The circular graph to the right outlines the proportion of individual Laureates who were born in different countries and received their Nobel Prize Award while schooling in the United States.\
+                        html.P(),
+                        html.P("- The top performing universities in terms of winning the Nobel Prize for their research are also based in the USA. It is true throughout all the scientific categories of the Award: Physics, Chemistry, Medicine, and Economics."),
+                        html.P(),
+                        html.P("- The circular graph to the right outlines the proportion of individual Laureates who were born in different countries and received their Nobel Prize Award while schooling in the United States.\
                             As can be seen, there is a fair fraction of reserchers whose home country is not the USA, but they have done their discoveries in American institutions."),
-                    ], className ="bare_container four columns"),
-            ],
-            className="row pretty_container",
-        ),
+                        ], className ="bare_container four columns"),
+                ],
+                className="row pretty_container",
+            ),
 
-    ]), # Main Body Div --end
+        ]), # Main Body Div --end
 
 
-    # Footer Div: References and Authors
-    html.Div([ 
-        # References pretty_container
-        html.Div(
-                [
-                    html.H6("References", style={"margin-top": "0","font-weight": "bold","text-align": "center"}),
-                    dcc.Markdown(
-                        """\
+        # Footer Div: References and Authors
+        html.Div([ 
+            # References pretty_container
+            html.Div(
+                    [
+                        html.H6("References", style={"margin-top": "0","font-weight": "bold","text-align": "center"}),
+                        dcc.Markdown(
+                            """\
                             - Inspiration #1 - Infographic: Nobel Prize winners 1901-2021: https://www.aljazeera.com/news/2021/10/7/infographic-nobel-prize-winners-1901-2021
                             - Inspiration #2 - "Nobel Prizes: Is there a secret formula to winning one?": https://www.bbc.com/future/article/20121008-winning-formula-for-nobel-prizes
                             - The Nobel Prize official website: https://www.nobelprize.org/prizes/
@@ -556,22 +732,24 @@ app.layout =  html.Div([
                             - Dashboard styling inspiration: https://dash.gallery/dash-food-consumption/
                             - Circular chord diagrams have been created with pyCirclize tool: https://moshi4.github.io/pyCirclize/chord_diagram/
                             """
-                    ,style={"font-size":"10pt"}),                  
-                ],
-                className="row pretty_container",
-            ),
+                        ,style={"font-size":"10pt"}),                  
+                    ],
+                    className="row pretty_container",
+                ),
 
-        # Authors pretty_container
-        html.Div(
-                [
-                    html.H6("Authors", style={"margin-top": "0","font-weight": "bold","text-align": "center"}),
-                    html.P("Cátia Parrinha (m20201320@novaims.unl.pt)  -  Iryna Savchuk (m20211310@novaims.unl.pt)", 
-                        style={"text-align": "center", "font-size":"10pt"}),
-                ],
-                className="row pretty_container",
-            )
-    ]) # Footer Div --end
-]) # app layout Div --end
+            # Authors pretty_container
+            html.Div(
+                    [
+                        html.H6("Authors", style={"margin-top": "0","font-weight": "bold","text-align": "center"}),
+                        html.P("Cátia Parrinha (m20201320@novaims.unl.pt)  -  Iryna Savchuk (m20211310@novaims.unl.pt)", 
+                            style={"text-align": "center", "font-size":"10pt"}),
+                    ],
+                    className="row pretty_container",
+                )
+        ]) # Footer Div --end
+    ]) # app layout Div --end
+
+app.layout = serve_layout
 
 
 #####################
@@ -581,18 +759,29 @@ app.layout =  html.Div([
 ################################### 1. WorldCLoud callback #####################################
 @app.callback(
     Output('image_wordcloud','src'),
-    Input('radio_category_general','value')
+    Output('wordcloud-poll','disabled'),
+    Output('wordcloud-poll','max_intervals'),
+    Input('radio_category_general','value'),
+    Input('year-range-slider','value'),
+    Input('checklist_gender_general','value'),
+    Input('wordcloud-poll','n_intervals')
 )
-def make_image(chosen_category):
-    # Filter by chosen category
-    if chosen_category==default_category:
-        chosen_df = df.copy()
-    else:
-        chosen_df = df.loc[df['category']==chosen_category.lower()]  
-    text = str(chosen_df['motivation'].values)
-    img = BytesIO()
-    plot_wordcloud(text).save(img, format='PNG')
-    return 'data:image/png;base64,{}'.format(base64.b64encode(img.getvalue()).decode())
+@metrics.instrument('make_image')
+def make_image(chosen_category, chosen_years, chosen_genders, n_intervals):
+    # Never waiting for a rendering, so the web worker is free at once: a new word cloud is rendered in the
+    # background while the default one of the category is shown, and the page polls until it is ready
+    # (at most render_timeout seconds, after that the default one stays)
+    selection = wordcloud_selection(chosen_category, chosen_years, chosen_genders)
+    ready = wordcloud_cache.start(selection, motivation_frequencies) is not None
+    metrics.mark('figure')
+    if ready:
+        return app.get_relative_path(wordcloud_cache.url(selection)), True, dash.no_update
+    if ctx.triggered_id == 'wordcloud-poll':
+        return dash.no_update, dash.no_update, dash.no_update
+    # Polling from the current count of the interval, which is never reset
+    fallback = wordcloud_selection(chosen_category, default_years, default_genders)
+    src = app.get_relative_path(wordcloud_cache.url(fallback)) if wordcloud_cache.cached(fallback) is not None else dash.no_update
+    return src, False, (n_intervals or 0) + int(np.ceil(render_timeout / render_poll))
 
 ###################### 2. Histogram Calback: Age when prize awarded #######################
 @app.callback(
@@ -609,198 +798,204 @@ def make_image(chosen_category):
         Input('radio_category','value'),
     ]
 )
+@metrics.instrument('get_ages')
+@figure_cache.memoize('get_ages')
 def get_ages(chosen_category):
-    # Filter by chosen category
+    # Precomputed statistics of the chosen category (see dataset.build_age_stats)
     if chosen_category==default_category:
-        chosen_df = df.loc[(df['gender']!='org')]
+        ages = dataset.ages[None]
     else:
-        chosen_df = df.loc[(df['gender']!='org') & (df['category']==chosen_category.lower())]
-
-    # Getting info about Max Age Individual Laureate
-    id_max = chosen_df['prizeAge'].idxmax()
-    max_age = chosen_df.loc[id_max,'prizeAge']
-    max_name = chosen_df.loc[id_max,'firstname'] + ' ' + chosen_df.loc[id_max,'surname']
-    max_year = chosen_df.loc[id_max,'year']
-    max_category = str(chosen_df.loc[id_max,'category']).capitalize()
-
-    # Getting info about Max Age Individual Laureate
-    id_min = chosen_df['prizeAge'].idxmin()
-    min_age = chosen_df.loc[id_min,'prizeAge']
-    min_name = chosen_df.loc[id_min,'firstname'] + ' ' + chosen_df.loc[id_min,'surname']
-    min_year = chosen_df.loc[id_min,'year']
-    min_category = str(chosen_df.loc[id_min,'category']).capitalize()
+        ages = dataset.ages[chosen_category.lower()]
+
+    # Info about Max and Min Age Individual Laureate
+    oldest, youngest = ages['max'], ages['min']
+    metrics.mark('filter')
 
     ######### Histogram: Age when prize awarded #########
-    fig_hist_age = px.histogram(chosen_df, 
-                            x='prizeAge', 
-                            color='gender', 
-                            marginal = 'box', # or violin, rug, box
-                            nbins=90,
-                            color_discrete_sequence=['#e4a76c', '#877769'])
-    fig_hist_age.update_layout(
-                           plot_bgcolor='rgba(0,0,0,0)',
-                           xaxis_title="Age", 
-                           yaxis_title="Number of Laureates",
-                           margin={"r":0,"t":0,"l":0,"b":0},
-                           legend_title_text = "",
-                           legend=dict(x=1, y=0.5, itemclick='toggleothers'),
-                           ) 
-    fig_hist_age.update_traces(hovertemplate="<br>".join(["Age award received: %{x}","Number of Laureates: %{y}",]))
-    fig_hist_age.update_layout(margin={"r":20,"t":50,"l":20,"b":20})
-
-    return str(max_age)+" years old", str(max_name), "Year: " + str(max_year) +" ("+max_category+")",\
-           str(min_age)+" years old", str(min_name), "Year: " + str(min_year) +" ("+min_category+")",\
+    # One bar per 1-year bin and a box plot from precomputed quartiles, instead of one point per laureate
+    hovertemplate = "<br>".join(["Age award received: %{x}","Number of Laureates: %{y}",])
+    colors = ['#e4a76c', '#877769']
+    data_hist_age = []
+    for (gender, stats), color in zip(ages['genders'].items(), colors):
+        box = stats['box']
+        data_hist_age.append(dict(type='bar', x=stats['ages'], y=stats['counts'], width=1,
+                                  name=gender, legendgroup=gender, marker=dict(color=color),
+                                  hovertemplate=hovertemplate, xaxis='x', yaxis='y'))
+        data_hist_age.append(dict(type='box', q1=[box['q1']], median=[box['median']], q3=[box['q3']],
+                                  lowerfence=[box['lowerfence']], upperfence=[box['upperfence']],
+                                  notchspan=[box['notchspan']], notched=True, y=[gender], orientation='h',
+                                  name=gender, legendgroup=gender, showlegend=False, marker=dict(color=color),
+                                  hovertemplate=hovertemplate, xaxis='x2', yaxis='y2'))
+        if box['outliers']:
+            data_hist_age.append(dict(type='scatter', x=box['outliers'], y=[gender]*len(box['outliers']), mode='markers',
+                                      name=gender, legendgroup=gender, showlegend=False, marker=dict(color=color),
+                                      hovertemplate=hovertemplate, xaxis='x2', yaxis='y2'))
+
+    # Only the traces change, the layout is already on the page
+    fig_hist_age = make_patch({'data': data_hist_age})
+    metrics.mark('figure')
+
+    return str(oldest['age'])+" years old", oldest['name'], "Year: " + str(oldest['year']) +" ("+oldest['category'].capitalize()+")",\
+           str(youngest['age'])+" years old", youngest['name'], "Year: " + str(youngest['year']) +" ("+youngest['category'].capitalize()+")",\
            fig_hist_age
 
 
 ################################ 3. Choropleth Map Callback #####################################
-@app.callback(
-    Output('choropleth-graph', 'figure'),
-    Input('scale-type', 'value'),
-    Input('category-type', 'value'),
-    [Input('year-range-slider', 'value')])
-
-def update_colorpleth(radiovalue, radiovalue2, slidervalue):
-
-    # Filtering years
-    mask = (df['year'] >= slidervalue[0]) & (df['year'] <= slidervalue[1])  # including the chosen years
-    df_chosen = df.loc[mask]
-
-    # Filter by chosen category
-    if radiovalue2==default_category:
-        df_chosen = df_chosen.loc[(df['gender']!='org')]
-    else:
-        df_chosen = df_chosen.loc[(df['gender']!='org') & (df['category']==radiovalue2.lower())]
-
-    # Generating dataframe for map
-    df_density = make_density_df(df_chosen)
-    
-    # Updating values that depend on Scale chosen by user
+@lru_cache(maxsize=1024)
+def choropleth_density(version, chosen_category, first_year, last_year):
+    # Laureates per country for the chosen category and years (including the chosen years),
+    # shared by the callbacks of the new selection and of the scale toggle
+    chosen_category = None if chosen_category==default_category else chosen_category.lower()
+    df_by_country = dataset.country_counts(chosen_category, (first_year, last_year))
+    return make_density_from_counts(df_by_country)
+
+def choropleth_scale(counts, radiovalue):
+    # Properties of the map trace that depend on the scale chosen by the user
     if radiovalue=="Log Scale":
-        z = np.log(df_density['count'])
+        z = np.log(counts)
         for_hover_string = ' (log)'
-        zmin=np.log(df_density['count'].min())
-        zmax=np.log(df_density['count'].max())
     else:
-        z = df_density['count']
+        z = counts
         for_hover_string = ''
-        zmin=df_density['count'].min()
-        zmax=df_density['count'].max()
-
-    # Cenerating a new Cholorpleth
-    data_choropleth = dict(type='choropleth',
-                            locations=df_density['iso-a3'],
-                            autocolorscale = False,
-                            z=z,
-                            zmin=zmin,
-                            zmax=zmax,
-                            colorscale = ["#fcf2bf", "#ab6400"],   
-                            marker_line_color = '#674e04',
-                            colorbar=dict(title='Total Prizes'+for_hover_string),
-                            text=df_density['name'],
-                            hovertemplate='Country: %{text} <br>'+'Prizes'+ for_hover_string+': %{z} <br><extra></extra>',
-                            )
-                        
-    layout_choropleth = dict(geo=dict(projection={'type': 'natural earth'}, 
-                            bgcolor= 'rgba(0,0,0,0)'))
-
-    fig_choropleth = go.Figure(data=data_choropleth, layout=layout_choropleth)
-    fig_choropleth.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
-    fig_choropleth.update_geos(showcoastlines=False)
+    return {'z': z, 'zmin': z.min(), 'zmax': z.max(),
+            'colorbar': dict(title=dict(text='Total Prizes'+for_hover_string)),
+            'hovertemplate': 'Country: %{text} <br>'+'Prizes'+ for_hover_string+': %{z} <br><extra></extra>'}
+
+@metrics.instrument('update_colorpleth')
+@figure_cache.memoize('update_colorpleth', shared=False) # ~7,500 possible inputs, kept out of the shared store
+def update_colorpleth(radiovalue2, slidervalue, radiovalue):
+    # New category or years: the countries and their values, the rest of the map stays as it is
+    df_density = choropleth_density(cache_version, radiovalue2, int(slidervalue[0]), int(slidervalue[1]))
+    metrics.mark('aggregate')
+
+    trace = dict(locations=df_density['iso-a3'], text=df_density['name'],
+                 **choropleth_scale(df_density['count'], radiovalue))
+    fig_choropleth = make_patch(trace, 0)
+    metrics.mark('figure')
     return fig_choropleth 
 
+@metrics.instrument('update_colorpleth_scale')
+@figure_cache.memoize('update_colorpleth_scale', shared=False)
+def update_colorpleth_scale(radiovalue2, slidervalue, radiovalue):
+    # New scale: only the values, from the counts of the selection that is already on the map
+    df_density = choropleth_density(cache_version, radiovalue2, int(slidervalue[0]), int(slidervalue[1]))
+    metrics.mark('filter')
+
+    fig_choropleth = make_patch(choropleth_scale(df_density['count'], radiovalue), 0)
+    metrics.mark('figure')
+    return fig_choropleth
+
+def update_choropleth(radiovalue2, slidervalue, radiovalue):
+    # One callback for the three controls: Dash drops the results of its earlier calls that are still in
+    # flight, so a late response for a selection cannot put back the previous scale. Toggling the scale
+    # only sends the values
+    if ctx.triggered_id == 'scale-type':
+        return update_colorpleth_scale(radiovalue2, slidervalue, radiovalue)
+    return update_colorpleth(radiovalue2, slidervalue, radiovalue)
+
+choropleth_inputs = [Input('scale-type', 'value'), Input('category-type', 'value'), Input('year-range-slider', 'value')]
+
+if clientside_map:
+    app.clientside_callback(ClientsideFunction(namespace='nobel', function_name='update_choropleth'),
+                            Output('choropleth-graph', 'figure'),
+                            *choropleth_inputs,
+                            State('choropleth-cube', 'data'),
+                            State('choropleth-graph', 'figure'))
+else:
+    app.callback(Output('choropleth-graph', 'figure'),
+                 Input('category-type', 'value'), Input('year-range-slider', 'value'),
+                 Input('scale-type', 'value'))(update_choropleth)
+
 
 ############################## 4. Universities Section Callback #####################################
 @app.callback(
     Output('fig_bar_uni','figure'),
-    Output('circle_US', 'children'),
+    Output('image_US', 'src'),
     Input('radio_science','value')
 )
+@metrics.instrument('get_top_uni')
+@figure_cache.memoize('get_top_uni')
 def get_top_uni(chosen_science):
-    # Filter by chosen category
+    # Precomputed ranking of the chosen category (see dataset.build_university_ranks)
     if chosen_science==default_science:
-        df_chosen = df.loc[(df['gender']!='org')]
+        df_top = dataset.top_universities(None, top_universities)
     else:
-        df_chosen = df.loc[(df['gender']!='org') & (df['category']==chosen_science.lower())]
-
-    df_chosen.loc[df_chosen['name'].isna(), :] = None #droping rows without university
-
-    df_chosen.loc[:, 'uni_full'] = df_chosen['name'] + ',' + df_chosen['country'] 
-    top = df_chosen['uni_full'].value_counts().head(10)
-    data = {'values': top.index[::-1], 'counts': top.values[::-1]}
-    df_top = pd.DataFrame(data)
-
-    # Splitting column into two columns based on comma separation
-    df_top[['University', 'Country']] = df_top['values'].str.split(',', expand=True)
-    df_top.drop('values', axis=1, inplace=True) # dropping the original column 
-
-    # Split long names of universities and add to new_labels list
-    new_labels = []
-    for label in df_top.loc[:,'University']:
-        new_label = split_long_label(label, 40) #allowing labels to be no wider than 40 letters
-        new_labels.append(new_label)
+        df_top = dataset.top_universities(chosen_science.lower(), top_universities)
+    df_top = df_top.iloc[::-1] # the largest bar on top
+    metrics.mark('filter')
 
     data_bar_uni = dict(type='bar',
                         x=df_top['counts'],
-                        y=new_labels, # edited df_top['University'],
+                        y=df_top['label'], # long names split into lines
                         text=df_top['Country'],
                         orientation='h',
-                        marker=dict(color=['#E3B166', '#D6A359', '#C8964D', '#BA8941', '#AC7D36', 
-                                        '#9D7030', '#8F6529', '#805823', '#714B1C', '#623F17']),
+                        marker=dict(color=uni_colors),
                         hovertemplate='%{y}, %{text}<br>'+'Laureates: %{x}<br><extra></extra>',
                         )
 
     layout_bar_uni = dict(#xaxis=dict(title='Number of Laureates'), 
-                        plot_bgcolor='#fbe9d9')
+                        plot_bgcolor='#fbe9d9',
+                        margin={"r":0,"t":0,"l":0,"b":0})
 
-    fig_bar_uni = go.Figure(data=[data_bar_uni], layout=layout_bar_uni)
-    fig_bar_uni.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
+    fig_bar_uni = make_figure([data_bar_uni], layout_bar_uni)
+    metrics.mark('figure')
 
-    file_name_US = chosen_science+'_US_.png'
-    full_path = 'assets/{}'.format(file_name_US)
-
-    # Creating a trace for the image
-    image_trace = go.layout.Image(
-        source=full_path,
-        xref="x",
-        yref="y",
-        x=0,
-        y=0,
-        sizex=1,
-        sizey=1,
-        #sizing="stretch",
-        opacity=1,
-        layer="above"
-    )
-
-    # Creating a plot with the image trace
-    fig_us = go.Figure()
-
-    fig_us.update_layout(
-        #width=100,
-        #height=100,
-        autosize=True,  # automatically adjust the size of the plot
-        margin=dict(l=0, r=0, t=0, b=0),
-        template='plotly_white',
-        xaxis=dict(
-            range=[0, 1], # set the x-axis range
-            autorange=False, # disable auto-ranging for the x-axis
-            showticklabels=False, # hide the x-axis tick labels
-            showgrid=False # hide the x-axis grid
-            ),
-        yaxis=dict(
-            range=[-1, 0], # set the y-axis range
-            autorange=False, # disable auto-ranging for the y-axis
-            showticklabels=False, # hide the y-axis tick labels
-            showgrid=False # hide the y-axis grid
-            ),
-        images=[image_trace], # add image trace to layout
-    )
-    
-    graph_style = {'position': 'absolute', 'top': 0, 'left': 0,
-                    'width': '100%', 'height': '100%'}
+    # Only the image URL changes, the browser caches each of the five images
+    image_US = app.get_relative_path(us_images.url(chosen_science+'_US_'))
+
+    return fig_bar_uni, image_US
+
+
+# Outputs of the callbacks for their default inputs (the year range depends on the dataset version),
+# prebuilt along with the static figures
+def callback_snapshots():
+    return {'get_ages': (get_ages, [default_category]),
+            'update_colorpleth': (update_colorpleth, [default_category, default_years, default_scale]),
+            'get_top_uni': (get_top_uni, [default_science])}
+
+@lru_cache(maxsize=None)
+def seed_callback_snapshots():
+    # Putting the snapshots into the figure cache, so the first callbacks of a page load are cache hits
+    for name, (callback, args) in callback_snapshots().items():
+        figure_cache.seed(name, args, snapshots.get_json(name, lambda: callback(*args)))
+
+
+def build_snapshots():
+    makers = dict(static_figures)
+    makers.update({name: partial(callback, *args) for name, (callback, args) in callback_snapshots().items()})
+    snapshots.build_all(makers)
+
+
+##########################
+#### Dataset Refresh #####
+##########################
 
-    return fig_bar_uni, dcc.Graph(figure=fig_us, config={'displayModeBar': False}, style=graph_style) 
+def use_dataset(new_dataset):
+    # Switching the app and every cache to a new dataset version, between two requests
+    global dataset, df, default_years, cache_version, wordcloud_cache, snapshots
+    previous_wordclouds = wordcloud_cache
+    dataset, df = new_dataset, new_dataset.df
+    default_years = [int(dataset.years[0]), int(dataset.years[-1])]
+    cache_version = dataset.version + '-' + source_version + '-' + figure_options
+    figure_cache.version = cache_version
+    snapshots = FigureSnapshots(cache_version)
+    seed_callback_snapshots.cache_clear()
+
+    # Word clouds of the categories without new laureates stay the same
+    unchanged = [c for c in category_options if c!=default_category and c.lower() not in dataset.changed_categories]
+    wordcloud_cache = WordCloudCache(dataset.version + '-' + source_version + '-' + render_settings)
+    wordcloud_cache.carry_over(previous_wordclouds, unchanged)
+    # The default word clouds cover the (maybe longer) year range of the new version, rendered in the background
+    wordcloud_cache.warm([wordcloud_selection(c, default_years, default_genders) for c in category_options],
+                         motivation_frequencies, wait=False)
+
+
+@server.before_request
+def refresh_dataset():
+    # Laureates appended with refresh.py are picked up without restarting the workers
+    new_dataset = dataset.refresh()
+    if new_dataset is not dataset:
+        use_dataset(new_dataset)
 
 
 ######################
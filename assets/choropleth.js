@@ -0,0 +1,53 @@
+// Client-side filtering of the choropleth map (enabled with NOBEL_CLIENTSIDE_MAP=1)
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    nobel: {
+        update_choropleth: function(scale, category, years, cube, figure) {
+            if (!cube._counts) {
+                // Decoding the (year, category, country) count cube once
+                const bytes = Uint8Array.from(atob(cube.counts), c => c.charCodeAt(0));
+                cube._counts = cube.dtype === 'uint8' ? bytes : new Uint16Array(bytes.buffer);
+            }
+            const nCategories = cube.categories.length;
+            const nCountries = cube.locations.length;
+            const c = category === 'All Categories' ? -1 : cube.categories.indexOf(category.toLowerCase());
+            const y0 = Math.max(years[0], cube.years[0]) - cube.years[0];
+            const y1 = Math.min(years[1], cube.years[1]) - cube.years[0];
+
+            // Summing the chosen years (and categories) per country
+            const totals = new Array(nCountries).fill(0);
+            for (let y = y0; y <= y1; y++) {
+                for (let k = 0; k < nCategories; k++) {
+                    if (c !== -1 && k !== c) continue;
+                    const offset = (y * nCategories + k) * nCountries;
+                    for (let i = 0; i < nCountries; i++) {
+                        totals[i] += cube._counts[offset + i];
+                    }
+                }
+            }
+
+            const locations = [], text = [], counts = [];
+            for (let i = 0; i < nCountries; i++) {
+                if (totals[i] > 0) {
+                    locations.push(cube.locations[i]);
+                    text.push(cube.names[i]);
+                    counts.push(totals[i]);
+                }
+            }
+
+            // Updating values that depend on Scale chosen by user
+            const log = scale === 'Log Scale';
+            const forHoverString = log ? ' (log)' : '';
+            const z = log ? counts.map(Math.log) : counts;
+            const trace = Object.assign({}, figure.data[0], {
+                locations: locations,
+                text: text,
+                z: z,
+                zmin: Math.min(...z),
+                zmax: Math.max(...z),
+                colorbar: {title: {text: 'Total Prizes' + forHoverString}},
+                hovertemplate: 'Country: %{text} <br>' + 'Prizes' + forHoverString + ': %{z} <br><extra></extra>',
+            });
+            return Object.assign({}, figure, {data: [trace]});
+        }
+    }
+});
@@ -0,0 +1,212 @@
+# Callback benchmark: drives the Dash callbacks through the Flask test client, as the browser would
+# (POST /_dash-update-component), with input sequences of typical interactions
+#
+#   python benchmarks/callbacks.py [--clients 4] [--passes 2] [--cache off] [--output run.json] [--compare base.json]
+#
+# Every client runs all scenarios in its own thread. The first pass starts from empty caches (figure cache,
+# word cloud PNGs of the selections), later passes show the cached latency. Results are printed per scenario
+# and callback, and can be saved as JSON and compared with an earlier run.
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import threading
+import subprocess
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+os.chdir(root)
+
+# Callbacks of the app, found in its callback map by function name. The map has one callback for its three
+# controls, timed as update_colorpleth or update_colorpleth_scale depending on the control that changed
+callback_functions = {'make_image': 'make_image', 'get_ages': 'get_ages', 'update_colorpleth': 'update_choropleth',
+                      'update_colorpleth_scale': 'update_choropleth', 'get_top_uni': 'get_top_uni'}
+
+categories = ['All Categories', 'Physics', 'Chemistry', 'Medicine', 'Literature', 'Peace', 'Economics']
+sciences = ['All Sciences', 'Physics', 'Chemistry', 'Medicine', 'Economics']
+genders = ['female', 'male', 'org']
+
+
+def slider_drag(rng):
+    # Dragging the end of the year range, then its start, for one category: every value updates
+    # the map and the word cloud
+    category = rng.choice(categories)
+    values = [[1901, last] for last in range(1950, 2023, 2)] + [[first, 2022] for first in range(1901, 1990, 2)]
+    for years in values:
+        yield 'update_colorpleth', [category, years, 'Log Scale'], 'year-range-slider.value'
+        yield 'make_image', [category, years, genders, None], 'year-range-slider.value'
+
+
+def category_toggle(rng):
+    for category in rng.sample(categories, len(categories)):
+        yield 'get_ages', [category], 'radio_category.value'
+        yield 'update_colorpleth', [category, [1901, 2022], rng.choice(['Log Scale', 'Absolute Count'])], 'category-type.value'
+        yield 'make_image', [category, [1901, 2022], genders, None], 'radio_category_general.value'
+
+
+def scale_toggle(rng):
+    # Switching between the scales of the map for a few selections
+    for category in rng.sample(categories, 3):
+        years = sorted(rng.sample(range(1901, 2023), 2))
+        for scale in ['Absolute Count', 'Log Scale'] * 2:
+            yield 'update_colorpleth_scale', [category, years, scale], 'scale-type.value'
+
+
+def science_radio(rng):
+    for science in rng.sample(sciences, len(sciences)) * 2:
+        yield 'get_top_uni', [science], 'radio_science.value'
+
+
+scenarios = {'slider_drag': slider_drag, 'category_toggle': category_toggle, 'scale_toggle': scale_toggle,
+             'science_radio': science_radio}
+
+
+def payload(entry, key, values, changed):
+    outputs = entry['output']
+    outputs = [{'id': o.component_id, 'property': o.component_property}
+               for o in (outputs if isinstance(outputs, list) else [outputs])]
+    return {'output': key,
+            'outputs': outputs if isinstance(entry['output'], list) else outputs[0],
+            # Values of the inputs, then of the states
+            'inputs': [dict(spec, value=value) for spec, value in zip(entry['inputs'], values)],
+            'state': [dict(spec, value=value) for spec, value in zip(entry['state'], values[len(entry['inputs']):])],
+            'changedPropIds': [changed]}
+
+
+def run_client(app, client_id, pass_id, results):
+    client = app.server.test_client()
+    keys = {name: next((key for key, entry in app.app.callback_map.items() if entry['callback'].__name__ == function), None)
+            for name, function in callback_functions.items()}
+    for scenario, make_inputs in scenarios.items():
+        # The same inputs in every pass
+        rng = random.Random('{}-{}'.format(scenario, client_id))
+        for name, values, changed in make_inputs(rng):
+            key = keys[name]
+            if key is None:
+                # e.g. the map is updated in the browser with NOBEL_CLIENTSIDE_MAP=1
+                continue
+            body = payload(app.app.callback_map[key], key, values, changed)
+            start = time.perf_counter()
+            response = client.post('/_dash-update-component', json=body)
+            elapsed = time.perf_counter() - start
+            results.append({'pass': pass_id, 'scenario': scenario, 'callback': name, 'seconds': elapsed,
+                            'bytes': len(response.get_data()), 'status': response.status_code})
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def summarize(results):
+    summary = {}
+    for row in results:
+        key = '{} pass {}'.format(row['scenario'], row['pass']), row['callback']
+        summary.setdefault(key, []).append(row)
+    stats = {}
+    for (scenario, callback), rows in sorted(summary.items()):
+        seconds = [row['seconds'] for row in rows]
+        stats.setdefault(scenario, {})[callback] = {
+            'requests': len(rows),
+            'errors': sum(row['status'] != 200 for row in rows),
+            'p50_ms': 1000 * percentile(seconds, 50),
+            'p95_ms': 1000 * percentile(seconds, 95),
+            'p99_ms': 1000 * percentile(seconds, 99),
+            'mean_bytes': sum(row['bytes'] for row in rows) / len(rows)}
+    return stats
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency, throughput and memory of the Dash callbacks')
+    parser.add_argument('--clients', type=int, default=4, help='number of concurrent clients (threads)')
+    parser.add_argument('--passes', type=int, default=2, help='runs of all scenarios, the first one with empty caches')
+    parser.add_argument('--cache', choices=['memory', 'sqlite', 'off'], help='figure cache backend (NOBEL_FIGURE_CACHE)')
+    parser.add_argument('--output', help='JSON file to save the results to')
+    parser.add_argument('--compare', help='JSON file of an earlier run, to print the change of p50 and p95')
+    args = parser.parse_args()
+
+    if args.cache:
+        os.environ['NOBEL_FIGURE_CACHE'] = args.cache
+    start = time.perf_counter()
+    import app
+    import_seconds = time.perf_counter() - start
+    rss_after_import = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Starting from empty caches: no figures in memory or in the shared store, only the default word clouds on disk
+    app.figure_cache.clear()
+    defaults = app.wordcloud_cache.keep
+    for file_name in os.listdir(app.wordcloud_cache.folder):
+        if os.path.join(app.wordcloud_cache.folder, file_name) not in defaults:
+            os.remove(os.path.join(app.wordcloud_cache.folder, file_name))
+    app.wordcloud_cache = app.WordCloudCache(app.wordcloud_cache.version)
+    app.wordcloud_cache.keep = defaults
+
+    results, passes = [], []
+    for pass_id in range(1, args.passes + 1):
+        start = time.perf_counter()
+        threads = [threading.Thread(target=run_client, args=(app, client_id, pass_id, results))
+                   for client_id in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+        requests = sum(row['pass'] == pass_id for row in results)
+        passes.append({'pass': pass_id, 'requests': requests, 'seconds': seconds, 'requests_per_second': requests / seconds})
+
+    run = {'revision': git_revision(),
+           'cache_version': app.cache_version,
+           'clients': args.clients,
+           'figure_cache': os.environ.get('NOBEL_FIGURE_CACHE', 'memory'),
+           'import_seconds': import_seconds,
+           # ru_maxrss is in kB on Linux
+           'rss_after_import_mb': rss_after_import / 1024,
+           'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+           'peak_rss_children_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+           'passes': passes,
+           'callbacks': summarize(results)}
+
+    print('{:<26} {:<18} {:>8} {:>6} {:>9} {:>9} {:>9} {:>10}'.format(
+        'scenario', 'callback', 'requests', 'errors', 'p50 [ms]', 'p95 [ms]', 'p99 [ms]', 'bytes'))
+    for scenario, callbacks in run['callbacks'].items():
+        for callback, stats in callbacks.items():
+            print('{:<26} {:<18} {:>8} {:>6} {:>9.1f} {:>9.1f} {:>9.1f} {:>10.0f}'.format(
+                scenario, callback, stats['requests'], stats['errors'], stats['p50_ms'], stats['p95_ms'],
+                stats['p99_ms'], stats['mean_bytes']))
+    print()
+    for row in passes:
+        print('pass {}: {} requests in {:.2f} s, {:.1f} requests/s with {} clients'.format(
+            row['pass'], row['requests'], row['seconds'], row['requests_per_second'], args.clients))
+    print('import {:.2f} s, RSS after import {:.0f} MB, peak RSS {:.0f} MB (render processes {:.0f} MB)'.format(
+        import_seconds, run['rss_after_import_mb'], run['peak_rss_mb'], run['peak_rss_children_mb']))
+
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+        print('\nchange from {} ({}):'.format(args.compare, base.get('revision')))
+        for scenario, callbacks in run['callbacks'].items():
+            for callback, stats in callbacks.items():
+                before = base['callbacks'].get(scenario, {}).get(callback)
+                if before:
+                    print('{:<26} {:<18} p50 {:>+7.1f}%  p95 {:>+7.1f}%  bytes {:>+7.1f}%'.format(
+                        scenario, callback, 100 * (stats['p50_ms'] / before['p50_ms'] - 1),
+                        100 * (stats['p95_ms'] / before['p95_ms'] - 1),
+                        100 * (stats['mean_bytes'] / before['mean_bytes'] - 1)))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
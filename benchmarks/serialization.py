@@ -0,0 +1,69 @@
+# Serialization benchmark: building and serializing the callback outputs with go.Figure objects (the default)
+# and with plain dict figures, typed arrays and orjson (NOBEL_FAST_FIGURES=1)
+#
+#   python benchmarks/serialization.py [--repeat 50]
+#
+# For each callback and path: time to build the output, to serialize it for the figure cache and for the
+# response (as Dash does), and the size of the response body, raw and gzipped. Runs without the figure cache.
+import os
+import sys
+import gzip
+import time
+import argparse
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+os.chdir(root)
+os.environ['NOBEL_FIGURE_CACHE'] = 'off'
+
+cases = {'get_ages': [['All Categories'], ['Physics'], ['Peace']],
+         'update_colorpleth': [['All Categories', [1901, 2022], 'Log Scale'], ['Physics', [1950, 2000], 'Absolute Count']],
+         'update_colorpleth_scale': [['All Categories', [1901, 2022], 'Absolute Count'], ['Physics', [1950, 2000], 'Log Scale']],
+         'get_top_uni': [['All Sciences'], ['Chemistry']]}
+
+
+def median_ms(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return 1000 * sorted(times)[len(times) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Figure building and serialization, go.Figure against plain dicts')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    import app
+    import figures
+    from dash._utils import to_json as dash_to_json
+
+    print('{:<24} {:<8} {:>10} {:>10} {:>12} {:>10} {:>10}'.format(
+        'callback', 'path', 'build [ms]', 'cache [ms]', 'response [ms]', 'bytes', 'gzip'))
+    for name, inputs in cases.items():
+        callback = getattr(app, name)
+        # Without the metrics and the figure cache
+        while hasattr(callback, '__wrapped__'):
+            callback = callback.__wrapped__
+        for path, fast in [('figure', False), ('fast', True)]:
+            figures.fast_figures = fast
+            build = cache = response = size = compressed = 0
+            for values in inputs:
+                output = callback(*values)
+                build += median_ms(lambda: callback(*values), args.repeat)
+                cache += median_ms(lambda: figures.to_json(output), args.repeat)
+                # Dash serializes the outputs of a callback in a response like this one
+                body = {'multi': True, 'response': {'output': {'figure': output}}}
+                response += median_ms(lambda: dash_to_json(body), args.repeat)
+                content = dash_to_json(body).encode()
+                size += len(content)
+                compressed += len(gzip.compress(content))
+            n = len(inputs)
+            print('{:<24} {:<8} {:>10.2f} {:>10.2f} {:>12.2f} {:>10.0f} {:>10.0f}'.format(
+                name, path, build / n, cache / n, response / n, size / n, compressed / n))
+
+
+if __name__ == '__main__':
+    main()
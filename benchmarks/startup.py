@@ -0,0 +1,65 @@
+# Startup benchmark: time to import the app, split by module (python -X importtime)
+#
+#   python benchmarks/startup.py [--top 20] [--budget 1.5] [--layout]
+#
+# --budget makes the script exit with an error when the import takes longer (in seconds),
+# --layout also times building the page layout, i.e. the first page load of a fresh worker.
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(statement):
+    # Each line of -X importtime: "import time: self [us] | cumulative | imported package"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=root, capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def wall_time(statement, repeat=3):
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], cwd=root, check=True, capture_output=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time of the app, split by module')
+    parser.add_argument('--top', type=int, default=20, help='number of slowest modules to list')
+    parser.add_argument('--depth', type=int, default=1, help='import depth below app to list')
+    parser.add_argument('--budget', type=float, help='maximum import time of app in seconds')
+    parser.add_argument('--layout', action='store_true', help='also time the first layout build')
+    args = parser.parse_args()
+
+    modules = import_times('import app')
+    # Nested imports are indented by two spaces per level
+    depth = lambda name: (len(name) - len(name.lstrip(' '))) // 2
+    listed = sorted((m for m in modules if depth(m[0]) <= args.depth), key=lambda m: -m[2])
+    print('{:<40} {:>12} {:>12}'.format('module', 'self [ms]', 'total [ms]'))
+    for name, self_us, cumulative_us in listed[:args.top]:
+        print('{:<40} {:>12.1f} {:>12.1f}'.format(name.strip(), self_us / 1000, cumulative_us / 1000))
+
+    total = wall_time('import app')
+    print('\nimport app: {:.3f} s (best of 3, including interpreter start)'.format(total))
+    if args.layout:
+        print('import app + layout: {:.3f} s'.format(wall_time('import app\nwith app.server.test_request_context(): app.serve_layout()')))
+
+    if args.budget is not None and total > args.budget:
+        print('Import time is over the budget of {:.3f} s'.format(args.budget))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
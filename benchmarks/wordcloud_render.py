@@ -0,0 +1,95 @@
+# Word cloud benchmark: layout time and output of the render modes (see wordclouds.py), for the default
+# selection of every category and for a sweep of ten-year ranges, as when dragging the year slider
+#
+#   python benchmarks/wordcloud_render.py [--repeat 3] [--save folder]
+#
+# Quality is compared with the 'default' mode: the share of its words that are also drawn, the share of its
+# 20 largest words among the 20 largest ones, and the share of the word counts of the selection drawn.
+# --save writes the images of every mode, to compare them side by side.
+import os
+import sys
+import time
+import argparse
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+os.chdir(root)
+
+from dataset import load_dataset
+from functions import word_frequencies
+from wordclouds import render_wordcloud, render_options, layout_key
+
+category_options = ['All Categories', 'Physics', 'Chemistry', 'Medicine', 'Literature', 'Peace', 'Economics']
+
+
+def selections():
+    for category in category_options:
+        yield category, None, (1901, 2022)
+    for first_year in range(1950, 1971):
+        yield 'All Categories', None, (first_year, first_year + 9)
+
+
+def largest(layout, n=20):
+    # Words of a layout by font size, largest first
+    return [word for (word, count), font_size, position, orientation, color in
+            sorted(layout, key=lambda item: -item[1])[:n]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Layout time and quality of the word cloud render modes')
+    parser.add_argument('--repeat', type=int, default=3, help='renderings per selection, the best one is kept')
+    parser.add_argument('--save', help='folder to write the images to')
+    args = parser.parse_args()
+
+    dataset = load_dataset()
+    frequencies = []
+    for category, genders, years in selections():
+        category = None if category == 'All Categories' else category.lower()
+        frequencies.append(word_frequencies(dataset.terms, dataset.term_frequencies(category, years, genders)))
+    names = ['{}_{}-{}'.format(c.replace(' ', '_'), *years) for c, genders, years in selections()]
+
+    print('{:<10} {:>10} {:>10} {:>8} {:>8} {:>8} {:>8} {:>10}'.format(
+        'mode', 'p50 [ms]', 'max [ms]', 'words', 'shared', 'top 20', 'counts', 'png [kB]'))
+    reference = {}
+    for mode in ['default'] + [m for m in render_options if m != 'default']:
+        times, words, shared, top, drawn, sizes = [], [], [], [], [], []
+        for name, selection in zip(names, frequencies):
+            best = None
+            for i in range(args.repeat):
+                start = time.perf_counter()
+                content, layout = render_wordcloud(selection, mode=mode)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            drawn_words = {word for (word, count), *rest in layout}
+            if mode == 'default':
+                reference[name] = layout
+            reference_words = {word for (word, count), *rest in reference[name]}
+            times.append(best)
+            words.append(len(layout))
+            shared.append(len(drawn_words & reference_words) / len(reference_words))
+            top.append(len(set(largest(layout)) & set(largest(reference[name]))) / len(largest(reference[name])))
+            drawn.append(sum(selection[word] for word in drawn_words) / sum(selection.values()))
+            sizes.append(len(content))
+            if args.save:
+                os.makedirs(args.save, exist_ok=True)
+                with open(os.path.join(args.save, '{}_{}.png'.format(name, mode)), 'wb') as f:
+                    f.write(content)
+        times.sort()
+        print('{:<10} {:>10.1f} {:>10.1f} {:>8.0f} {:>8.2f} {:>8.2f} {:>8.2f} {:>10.1f}'.format(
+            mode, 1000 * times[len(times) // 2], 1000 * times[-1], sum(words) / len(words),
+            sum(shared) / len(shared), sum(top) / len(top), sum(drawn) / len(drawn), sum(sizes) / len(sizes) / 1024))
+
+    # Layout reuse (NOBEL_WORDCLOUD_REUSE_LAYOUT=1): selections of the slider sweep and of the gender toggles
+    # that are drawn with the layout of an earlier selection
+    keys = [layout_key(selection) for selection in frequencies[len(category_options):]]
+    print('\nlayout reuse: {} of {} ten-year ranges'.format(len(keys) - len(set(keys)), len(keys)))
+    keys = []
+    for category in category_options:
+        category = None if category == 'All Categories' else category.lower()
+        for genders in [('female', 'male', 'org'), ('female', 'male'), ('male', 'org'), ('male',), ('female', 'org'), ('female',)]:
+            keys.append(layout_key(word_frequencies(dataset.terms, dataset.term_frequencies(category, None, genders))))
+    print('layout reuse: {} of {} gender selections'.format(len(keys) - len(set(keys)), len(keys)))
+
+
+if __name__ == '__main__':
+    main()
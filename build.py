@@ -0,0 +1,16 @@
+# Build step, to run once per deploy before the workers start (e.g. as part of the build command):
+#   python build.py
+# Importing the app renders the word clouds into the cache, then the optimized images, the gzip and
+# brotli copies of the assets and the figure snapshots are written.
+# Workers load the snapshots instead of building the figures, and rebuild them if the data has changed.
+import time
+
+import app
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    app.us_images.build()
+    app.assets.build()
+    app.build_snapshots()
+    print('Snapshots for version {} written to {} in {:.2f} s'.format(
+        app.cache_version, app.snapshots.folder, time.perf_counter() - start))
@@ -0,0 +1,165 @@
+import os
+import gzip
+import mimetypes
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+from functions import cache_path, file_hash, write_atomic
+from wordclouds import cache_control
+
+# brotli is optional (pip install brotli), without it responses and assets are only gzipped
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than NOBEL_COMPRESS_MIN_BYTES are sent as they are, the headers would eat most of the saving
+compress_min_bytes = int(os.environ.get('NOBEL_COMPRESS_MIN_BYTES', 1024))
+# Levels for responses compressed per request, precompressed assets use the highest ones
+gzip_level = int(os.environ.get('NOBEL_GZIP_LEVEL', 6))
+brotli_quality = int(os.environ.get('NOBEL_BROTLI_QUALITY', 5))
+compressible_types = {'application/json', 'text/html', 'text/css', 'text/plain', 'text/javascript',
+                      'application/javascript', 'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon'}
+# Precompressed copies bigger than this share of the asset are not kept (e.g. PNG and JPEG)
+min_saving = 0.9
+# Asset URLs without the version (e.g. images referenced from the CSS) are revalidated on each use
+revalidate_cache_control = 'no-cache'
+# Compressed long-lived responses (the Dash component bundles) kept in memory per process
+max_entries = 64
+
+
+def encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def accepted_encoding(request, available=None):
+    # Preferred encoding that the client accepts, brotli before gzip, or None
+    for encoding in available if available is not None else encodings():
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compress(content, encoding, best=False):
+    if encoding == 'br':
+        return brotli.compress(content, quality=11 if best else brotli_quality)
+    return gzip.compress(content, compresslevel=9 if best else gzip_level, mtime=0)
+
+
+class ResponseCompression:
+    # Compresses the callback and layout JSON, the index page and the Dash bundles when the client accepts it
+
+    def __init__(self, min_bytes=compress_min_bytes, max_entries=max_entries):
+        self.min_bytes = min_bytes
+        self.max_entries = max_entries
+        self._static = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compressed(self, response, encoding):
+        content = response.get_data()
+        if response.cache_control.max_age is None or response.cache_control.max_age < 86400:
+            return compress(content, encoding)
+        # Fingerprinted bundles are the same for every client, they are compressed once per process
+        key = (request.full_path, encoding)
+        with self._lock:
+            if key in self._static:
+                self._static.move_to_end(key)
+                return self._static[key]
+        value = compress(content, encoding)
+        with self._lock:
+            self._static[key] = value
+            while len(self._static) > self.max_entries:
+                self._static.popitem(last=False)
+        return value
+
+    def after_request(self, response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers or response.mimetype not in compressible_types):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = accepted_encoding(request)
+        if encoding is None or response.calculate_content_length() < self.min_bytes:
+            return response
+        response.set_data(self.compressed(response, encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            # Each encoding is another representation, with its own validator
+            response.set_etag('{}-{}'.format(etag, encoding), weak)
+        return response
+
+
+class PrecompressedAssets:
+    # Files of the assets folder served with gzip and brotli copies written once (see build.py), in
+    # <cache_path>/assets/ and keyed by the file hash. URLs with the version of the file (?v=, or Dash's ?m=
+    # mtime fingerprint) are cached by browsers for a year, the others are revalidated with the ETag
+
+    def __init__(self, source_folder='assets/', folder=None):
+        self.source_folder = source_folder
+        self.folder = os.path.join(folder or cache_path, 'assets')
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def source_file(self, name):
+        return os.path.join(self.source_folder, name)
+
+    def names(self):
+        return sorted(name for name in os.listdir(self.source_folder)
+                      if os.path.isfile(self.source_file(name)))
+
+    def version(self, name):
+        # File hash, computed again when the file changes (e.g. while developing)
+        mtime = os.path.getmtime(self.source_file(name))
+        with self._lock:
+            if self._versions.get(name, (None,))[0] != mtime:
+                self._versions[name] = (mtime, file_hash(self.source_file(name)))
+            return self._versions[name][1]
+
+    def file_name(self, name, encoding):
+        return os.path.join(self.folder, '{}.{}.{}'.format(name, self.version(name), encoding))
+
+    def skip_file_name(self, name):
+        # Marker of an asset that does not get smaller when compressed
+        return os.path.join(self.folder, '{}.{}.raw'.format(name, self.version(name)))
+
+    def compressed_files(self, name):
+        # Precompressed copies of an asset by encoding, written on first use
+        if os.path.exists(self.skip_file_name(name)):
+            return {}
+        files = {encoding: self.file_name(name, encoding) for encoding in encodings()}
+        if all(os.path.exists(file_name) for file_name in files.values()):
+            return files
+        with open(self.source_file(name), 'rb') as f:
+            content = f.read()
+        for encoding, file_name in files.items():
+            compressed = compress(content, encoding, best=True)
+            if len(compressed) > min_saving * len(content):
+                write_atomic(self.skip_file_name(name), b'')
+                return {}
+            write_atomic(file_name, compressed)
+        return files
+
+    def response(self, name, request):
+        if name not in self.names():
+            return Response(status=404)
+        version = self.version(name)
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        files = self.compressed_files(name)
+        encoding = accepted_encoding(request, [encoding for encoding in encodings() if encoding in files])
+        with open(files[encoding] if encoding else self.source_file(name), 'rb') as f:
+            response = Response(f.read(), mimetype=mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if files:
+            response.vary.add('Accept-Encoding')
+        response.set_etag(version + ('-' + encoding if encoding else ''))
+        response.last_modified = os.path.getmtime(self.source_file(name))
+        fingerprinted = request.args.get('v') == version or 'm' in request.args
+        response.headers['Cache-Control'] = cache_control if fingerprinted else revalidate_cache_control
+        return response.make_conditional(request)
+
+    def build(self):
+        for name in self.names():
+            self.compressed_files(name)
@@ -0,0 +1,549 @@
+import os
+import copy
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from functions import path, cache_path, file_hash, write_atomic, split_long_label
+
+# Column types of the columnar store. Names, places and institutions repeat, so they are stored as codes too.
+# The other columns (the motivations) are free text, kept out of the frame as UTF-8 (see TextColumn)
+categorical_columns = ['category', 'gender', 'bornCountryCode', 'diedCountryCode', 'firstname', 'surname',
+                       'bornCountry', 'bornCity', 'diedCountry', 'diedCity', 'name', 'city', 'country']
+integer_columns = {'id': 'int32', 'born': 'int16', 'died': 'int16', 'year': 'int16',
+                   'share': 'int8', 'prizeAge': 'int16'}
+# Part of the name of the cache folders, changed with the way columns are stored so that folders written in
+# an older layout are never read
+store_format = '2'
+# Number of versions of the dataset kept in <cache_path>/dataset/, the least recently loaded ones are removed
+max_versions = int(os.environ.get('NOBEL_DATASET_VERSIONS', 3))
+
+
+class Dataset:
+    # Nobel laureates loaded once per process, with precomputed row indexes per (category, is_org)
+
+    def __init__(self, df, texts, version, folder=None):
+        self.df = df
+        self.texts = texts # free text columns, as TextColumn
+        self.version = version
+        self.folder = folder # cache folder of the base csv, where appended rows are stored too
+        self.categories = list(df['category'].cat.categories)
+        self.changed_categories = set(self.categories)
+        self.index = build_row_index(df)
+        self.years, self.country_codes, self.year_counts = build_year_counts(df)
+        self.institutions, self.cube = build_count_cube(df)
+        self.gender_by_year = build_gender_by_year(self)
+        self.terms, self.term_counts = build_term_counts(df, texts['motivation'].to_numpy())
+        self.ages = {category: build_age_stats(df.iloc[self.rows(category)]) for category in [None] + self.categories}
+        self.universities = build_university_ranks(self, [None] + self.categories)
+        self._checked = 0
+        self._manifest_mtime = None
+
+    def append(self, new_df, new_texts, version):
+        # New Dataset with the rows of new_df (and their text columns, new_texts) added, updating only the
+        # aggregates of the categories they touch
+        df = concat_typed(self.df, typed_frame(new_df[self.df.columns]))
+        texts = {column: text.append(new_texts[column]) for column, text in self.texts.items()}
+        new_rows = df.iloc[len(self.df):]
+        changed = set(new_rows['category'].astype(str))
+        if list(df['category'].cat.categories) != self.categories or new_rows['year'].min() < self.years[0]:
+            # A new prize category or earlier years change the shape of every aggregate
+            return Dataset(df, texts, version, self.folder)
+
+        dataset = copy.copy(self)
+        dataset.df = df
+        dataset.texts = texts
+        dataset.version = version
+        dataset.changed_categories = changed
+
+        new_index = build_row_index(new_rows)
+        dataset.index = {key: np.concatenate([rows, new_index[key] + len(self.df)]) for key, rows in self.index.items()}
+
+        # Prefix sums: padding the old ones to the new years and countries, then adding the new rows
+        years = np.arange(self.years[0], max(self.years[-1], new_rows['year'].max()) + 1)
+        dataset.years, dataset.country_codes, delta = build_year_counts(new_rows, years)
+        n_years, n_countries = self.year_counts.shape[1], self.year_counts.shape[2]
+        dataset.year_counts = delta
+        dataset.year_counts[:, :n_years, :n_countries] += self.year_counts
+        dataset.year_counts[:, n_years:, :n_countries] += self.year_counts[:, -1:, :]
+
+        # Cells of the new rows are added to the cube, the queries sum them with the old ones
+        dataset.institutions, cube = build_count_cube(new_rows, self.institutions)
+        dataset.cube = pd.concat([self.cube, cube], ignore_index=True)
+        dataset.gender_by_year = build_gender_by_year(dataset)
+
+        # Word forms keep their codes, so the counts of the new rows are simply added to the index
+        dataset.terms, term_counts = build_term_counts(new_rows, new_texts['motivation'].to_numpy(), self.terms)
+        dataset.term_counts = pd.concat([self.term_counts, term_counts], ignore_index=True)
+
+        dataset.ages = dict(self.ages)
+        for category in [None] + sorted(changed):
+            dataset.ages[category] = build_age_stats(df.iloc[dataset.rows(category)])
+        dataset.universities = dict(self.universities)
+        dataset.universities.update(build_university_ranks(dataset, [None] + sorted(changed)))
+        return dataset
+
+    def refresh(self, interval=1.0):
+        # Picking up rows appended to the store (see refresh.py), checking at most once per interval seconds
+        now = time.monotonic()
+        if self.folder is None or now - self._checked < interval:
+            return self
+        self._checked = now
+        try:
+            mtime = os.path.getmtime(manifest_file(self.folder))
+        except OSError:
+            return self
+        if mtime == self._manifest_mtime:
+            return self
+
+        versions = read_manifest(self.folder)
+        if self.version in versions:
+            dataset = self
+        else:
+            # Not on the chain of appended versions (e.g. the store was reset), starting over from the csv
+            dataset = load_dataset(base=True)
+        changed = set()
+        for version in versions[versions.index(dataset.version) + 1:]:
+            dataset = dataset.append(*read_columns(os.path.join(self.folder, 'deltas', version)), version)
+            changed |= dataset.changed_categories
+        if dataset is not self and self.version in versions:
+            dataset.changed_categories = changed
+        dataset._checked, dataset._manifest_mtime = now, mtime
+        return dataset
+
+    def rows(self, category=None, org=False):
+        # Row positions for a category (None means all categories) and laureate type (None means both)
+        return self.index[(category, org)]
+
+    def select(self, category=None, org=False):
+        return self.df.iloc[self.rows(category, org)]
+
+    def top_universities(self, category=None, n=10, country=None):
+        # Institutions of individual laureates ranked by number of laureates, optionally in one country only
+        ranking = self.universities[category]
+        if country is not None:
+            ranking = ranking['by_country'].get(country, ranking['all'].iloc[:0])
+        else:
+            ranking = ranking['all']
+        return ranking.iloc[:n]
+
+    def country_counts(self, category=None, year_range=None):
+        # Individual laureates per country of birth awarded within [y0, y1], from two rows of the prefix sums
+        first, last = self.years[0], self.years[-1]
+        y0, y1 = year_range or (first, last)
+        y0, y1 = max(int(y0), first), min(int(y1), last)
+        c = len(self.categories) if category is None else self.categories.index(category)
+        if y0 > y1:
+            counts = np.zeros(len(self.country_codes), dtype=self.year_counts.dtype)
+        else:
+            counts = self.year_counts[c, y1 - first + 1] - self.year_counts[c, y0 - first]
+        found = counts > 0
+        return pd.DataFrame({'count': counts[found]},
+                            index=pd.Index(self.country_codes[found], name='bornCountryCode'))
+
+    def labels(self, dimension):
+        # Values of a dimension of the count cube, in the order of their codes
+        if dimension == 'year':
+            return self.years
+        if dimension == 'category':
+            return self.categories
+        if dimension == 'gender':
+            return list(self.df['gender'].cat.categories)
+        if dimension == 'country':
+            return self.country_codes
+        return self.institutions
+
+    def codes(self, dimension):
+        # Code of each cell of the cube in a dimension, -1 where the laureate has no value
+        codes = self.cube[dimension].to_numpy()
+        return codes - self.years[0] if dimension == 'year' else codes
+
+    def count(self, by=(), category=None, year_range=None, genders=None, org=None, country=None, institution=None):
+        # Laureates in a selection of the count cube, summed over the dimensions not in by: a Series indexed
+        # by the values of the by dimensions (non-empty groups only, in the order of their codes), or a number.
+        # category, genders and country take one value or a list, institution a (name, country) pair or a
+        # list of them, org selects organisations (True) or individuals (False)
+        selected = np.ones(len(self.cube), dtype=bool)
+        filters = {'category': category, 'gender': genders, 'country': country, 'institution': institution}
+        for dimension, values in filters.items():
+            if values is not None:
+                if isinstance(values, (str, tuple)):
+                    values = [values]
+                wanted = pd.Index(self.labels(dimension)).get_indexer(values)
+                selected &= np.isin(self.cube[dimension].to_numpy(), wanted[wanted >= 0])
+        if year_range is not None:
+            years = self.cube['year'].to_numpy()
+            selected &= (years >= year_range[0]) & (years <= year_range[1])
+        if org is not None:
+            org_code = self.labels('gender').index('org') if 'org' in self.labels('gender') else -1
+            selected &= (self.cube['gender'].to_numpy() == org_code) == org
+
+        counts = self.cube['count'].to_numpy()
+        if not by:
+            return int(counts[selected].sum())
+        codes = [self.codes(dimension) for dimension in by]
+        for dimension_codes in codes:
+            # Like groupby, laureates without a value (e.g. no institution) are left out
+            selected &= dimension_codes >= 0
+        shape = [len(self.labels(dimension)) for dimension in by]
+        cells = np.ravel_multi_index([dimension_codes[selected] for dimension_codes in codes], shape)
+        found, position = np.unique(cells, return_inverse=True)
+        sums = np.bincount(position, weights=counts[selected], minlength=len(found)).astype(int)
+
+        values = []
+        for dimension, dimension_codes in zip(by, np.unravel_index(found, shape)):
+            labels = self.labels(dimension)
+            values.append(labels[dimension_codes] if dimension == 'institution' else np.asarray(labels)[dimension_codes])
+        if by == ['institution']:
+            # Indexed by University and Country
+            return pd.Series(sums, index=values[0], name='count')
+        values = [value.to_flat_index() if isinstance(value, pd.MultiIndex) else value for value in values]
+        if len(by) == 1:
+            return pd.Series(sums, index=pd.Index(values[0], name=by[0]), name='count')
+        return pd.Series(sums, index=pd.MultiIndex.from_arrays(values, names=list(by)), name='count')
+
+    def term_frequencies(self, category=None, year_range=None, genders=None):
+        # Occurrences of each word form of self.terms in the motivations of a category, year range and genders
+        counts = self.term_counts
+        selected = np.ones(len(counts), dtype=bool)
+        if category is not None:
+            selected &= counts['category'].to_numpy() == self.categories.index(category)
+        if year_range is not None:
+            years = counts['year'].to_numpy()
+            selected &= (years >= year_range[0]) & (years <= year_range[1])
+        if genders is not None:
+            codes = [code for code, gender in enumerate(self.df['gender'].cat.categories) if gender in genders]
+            selected &= np.isin(counts['gender'].to_numpy(), codes)
+        return np.bincount(counts['term'].to_numpy()[selected], weights=counts['count'].to_numpy()[selected],
+                           minlength=len(self.terms)).astype(int)
+
+
+def build_row_index(df):
+    category_codes = df['category'].cat.codes.to_numpy()
+    is_org = (df['gender'] == 'org').to_numpy()
+    by_org = {None: np.ones(len(df), dtype=bool), True: is_org, False: ~is_org}
+
+    index = {}
+    for org, org_mask in by_org.items():
+        index[(None, org)] = np.flatnonzero(org_mask)
+        for code, category in enumerate(df['category'].cat.categories):
+            index[(category, org)] = np.flatnonzero(org_mask & (category_codes == code))
+    return index
+
+
+def build_year_counts(df, years=None):
+    # Cumulative counts of individual laureates along the year axis, per (category, country of birth).
+    # The last category slot holds all categories, and row 0 of the year axis is all zeros
+    if years is None:
+        years = np.arange(df['year'].min(), df['year'].max() + 1)
+    country_codes = np.asarray(df['bornCountryCode'].cat.categories, dtype=object)
+    n_categories = len(df['category'].cat.categories)
+
+    category_code = df['category'].cat.codes.to_numpy()
+    country_code = df['bornCountryCode'].cat.codes.to_numpy()
+    year_pos = df['year'].to_numpy() - years[0]
+    keep = (df['gender'] != 'org').to_numpy() & (country_code >= 0)
+
+    counts = np.zeros((n_categories + 1, len(years), len(country_codes)), dtype=np.int32)
+    np.add.at(counts, (category_code[keep], year_pos[keep], country_code[keep]), 1)
+    counts[n_categories] = counts[:n_categories].sum(axis=0)
+
+    cumulative = np.zeros((n_categories + 1, len(years) + 1, len(country_codes)), dtype=np.int32)
+    np.cumsum(counts, axis=1, out=cumulative[:, 1:])
+    return years, country_codes, cumulative
+
+
+def build_gender_by_year(dataset):
+    # Number of laureates per year (rows) and gender (columns)
+    counts = dataset.count(['year', 'gender']).unstack(fill_value=0)
+    counts.index = counts.index.astype(int)
+    counts.columns = counts.columns.astype(str)
+    return counts
+
+
+def tokenize(texts):
+    # Words as WordCloud.process_text finds them, without the possessive 's and without numbers.
+    # The index of the result is the position of the text that each word comes from
+    words = pd.Series(texts, dtype=object).str.findall(r"\w[\w']*").explode().dropna()
+    words = words.str.replace(r"'[sS]$", '', regex=True)
+    return words[~words.str.isdigit()]
+
+
+def build_term_counts(df, motivations, terms=None):
+    # Word forms of the motivations (one per row of df) counted per (category, year, gender), one row per non-empty
+    # bucket and word, so that any selection is a mask and a bincount. Codes of the terms of an earlier index are kept
+    words = tokenize(motivations)
+    terms = pd.Index([] if terms is None else terms, dtype=object)
+    terms = terms.append(pd.Index(words.unique(), dtype=object)).unique()
+    positions = words.index.to_numpy()
+    counts = pd.DataFrame({'category': df['category'].cat.codes.to_numpy()[positions],
+                           'year': df['year'].to_numpy()[positions],
+                           'gender': df['gender'].cat.codes.to_numpy()[positions],
+                           'term': terms.get_indexer(words.to_numpy())})
+    counts = counts.groupby(['category', 'year', 'gender', 'term']).size().rename('count').reset_index()
+    return terms.to_numpy(), counts.astype({'category': 'int8', 'year': 'int16', 'gender': 'int8',
+                                            'term': 'int32', 'count': 'int32'})
+
+
+def build_count_cube(df, institutions=None):
+    # Laureates counted per (year, category, gender, country of birth, institution), one row per non-empty cell,
+    # so that any filter is a mask and any group-by a bincount (see Dataset.count). Countries are the codes of
+    # bornCountryCode, institutions (name, country) pairs coded in order of first appearance.
+    # Codes of the institutions of an earlier cube are kept
+    pairs = pd.MultiIndex.from_arrays([df['name'].astype(object), df['country'].astype(object)],
+                                      names=['University', 'Country'])
+    has_pair = (df['name'].notna() & df['country'].notna()).to_numpy()
+    if institutions is None:
+        institutions = pairs[:0]
+    institutions = institutions.append(pairs[has_pair].unique()).unique()
+    cube = pd.DataFrame({'year': df['year'].to_numpy(),
+                         'category': df['category'].cat.codes.to_numpy(),
+                         'gender': df['gender'].cat.codes.to_numpy(),
+                         'country': df['bornCountryCode'].cat.codes.to_numpy(),
+                         'institution': np.where(has_pair, institutions.get_indexer(pairs), -1)})
+    cube = cube.groupby(list(cube.columns)).size().rename('count').reset_index()
+    return institutions, cube.astype({'year': 'int16', 'category': 'int8', 'gender': 'int8', 'country': 'int16',
+                                      'institution': 'int32', 'count': 'int32'})
+
+
+def build_university_ranks(dataset, categories):
+    # Ranking of the institutions of individual laureates per category, from the count cube
+    ranks = {}
+    for category in categories:
+        counts = dataset.count(['institution'], category=category, org=False)
+        # Most laureates first, ties in order of first appearance in the dataset (the order of the codes)
+        order = np.argsort(-counts.to_numpy(), kind='stable')
+        counts = counts.iloc[order]
+        ranking = pd.DataFrame({'University': counts.index.get_level_values('University'),
+                                'Country': counts.index.get_level_values('Country'),
+                                'counts': counts.to_numpy()})
+        ranking['label'] = [split_long_label(name, 40) for name in ranking['University']] # no wider than 40 letters
+        ranks[category] = {'all': ranking,
+                           'by_country': {country: group for country, group in ranking.groupby('Country', sort=False)}}
+    return ranks
+
+
+def box_quantile(values, p):
+    # Same interpolation as the plotly.js box trace (quartilemethod='linear'), values are sorted
+    n = p * len(values) - 0.5
+    if n < 0:
+        return float(values[0])
+    if n > len(values) - 1:
+        return float(values[-1])
+    frac = n % 1
+    return float(frac * values[int(np.ceil(n))] + (1 - frac) * values[int(np.floor(n))])
+
+
+def build_box_stats(ages):
+    # Quartiles, fences, notch and outliers of a box plot, so the browser does not need the raw ages
+    ages = np.sort(ages)
+    q1, median, q3 = (box_quantile(ages, p) for p in (0.25, 0.5, 0.75))
+    iqr = q3 - q1
+    inside = ages[(ages >= q1 - 1.5 * iqr) & (ages <= q3 + 1.5 * iqr)]
+    lowerfence, upperfence = min(float(inside[0]), q1), max(float(inside[-1]), q3)
+    return {'q1': q1, 'median': median, 'q3': q3,
+            'lowerfence': lowerfence, 'upperfence': upperfence,
+            'notchspan': 1.57 * iqr / np.sqrt(len(ages)),
+            'outliers': ages[(ages < lowerfence) | (ages > upperfence)].tolist()}
+
+
+def build_age_stats(chosen_df):
+    # Oldest and youngest laureate, and the age histogram (1-year bins) and box plot per gender
+    def laureate(row_id):
+        row = chosen_df.loc[row_id]
+        return {'age': int(row['prizeAge']), 'name': row['firstname'] + ' ' + row['surname'],
+                'year': int(row['year']), 'category': str(row['category'])}
+
+    stats = {'max': laureate(chosen_df['prizeAge'].idxmax()),
+             'min': laureate(chosen_df['prizeAge'].idxmin()),
+             'genders': {}}
+    # Genders in order of first appearance, as plotly express assigns the colors
+    for gender in pd.unique(chosen_df['gender'].astype(str)):
+        ages = chosen_df.loc[chosen_df['gender'] == gender, 'prizeAge'].to_numpy()
+        values, counts = np.unique(ages, return_counts=True)
+        stats['genders'][gender] = {'ages': values.tolist(), 'counts': counts.tolist(),
+                                    'box': build_box_stats(ages)}
+    return stats
+
+
+class TextColumn:
+    # Free text as UTF-8 bytes and the offset of each row in them (plus a mask of missing values), memory-mapped
+    # so that all workers share the pages through the OS cache and a row is only decoded when it is read.
+    # Appended rows are further segments, each read from its own folder
+
+    def __init__(self, segments):
+        self.segments = segments # (data, offsets, missing) arrays
+
+    @classmethod
+    def read(cls, folder, column):
+        return cls([tuple(np.load(os.path.join(folder, column + suffix), mmap_mode='r')
+                          for suffix in ['.npy', '.offsets.npy', '.na.npy'])])
+
+    def __len__(self):
+        return sum(len(missing) for _, _, missing in self.segments)
+
+    def append(self, other):
+        return TextColumn(self.segments + other.segments)
+
+    def to_numpy(self):
+        # The texts as python strings, NaN where missing
+        texts = np.empty(len(self), dtype=object)
+        start = 0
+        for data, offsets, missing in self.segments:
+            data, offsets = data.tobytes(), offsets.tolist()
+            texts[start:start + len(missing)] = [data[offsets[i]:offsets[i + 1]].decode('utf-8')
+                                                 for i in range(len(missing))]
+            texts[start:start + len(missing)][missing] = np.nan
+            start += len(missing)
+        return texts
+
+
+def write_text(values, folder, column):
+    encoded = [text.encode('utf-8') for text in values.fillna('').astype(str)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in encoded], out=offsets[1:])
+    np.save(os.path.join(folder, column + '.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(os.path.join(folder, column + '.offsets.npy'), offsets)
+    np.save(os.path.join(folder, column + '.na.npy'), values.isna().to_numpy())
+
+
+def typed_frame(df):
+    # Categorical codes and narrow integer types instead of python objects and int64
+    df = df.copy()
+    for column in categorical_columns:
+        df[column] = df[column].astype('category')
+    for column, dtype in integer_columns.items():
+        df[column] = df[column].astype(dtype)
+    return df
+
+
+def concat_typed(df, new_df):
+    # Appending rows, with the categories that new_df adds placed after the existing ones so old codes stay valid
+    columns = {}
+    for column in df.columns:
+        if column in categorical_columns:
+            categories = list(df[column].cat.categories)
+            categories += [c for c in new_df[column].cat.categories if c not in set(categories)]
+            new_codes = pd.Categorical(new_df[column].astype(object), categories=categories).codes
+            codes = np.concatenate([df[column].cat.codes.to_numpy(), new_codes])
+            columns[column] = pd.Categorical.from_codes(codes, categories)
+        elif column in integer_columns:
+            columns[column] = np.concatenate([df[column].to_numpy(), new_df[column].to_numpy()])
+        else:
+            columns[column] = np.concatenate([df[column].to_numpy(dtype=object), new_df[column].to_numpy(dtype=object)])
+    return pd.DataFrame(columns)
+
+
+def write_columns(df, folder):
+    # One .npy file per column (codes for categoricals, UTF-8 for text) plus a json file with the schema
+    schema = {'columns': [], 'categories': {}, 'text': []}
+    for column in df.columns:
+        schema['columns'].append(column)
+        values = df[column]
+        if column in categorical_columns:
+            schema['categories'][column] = [str(c) for c in values.cat.categories]
+            np.save(os.path.join(folder, column + '.npy'), values.cat.codes.to_numpy())
+        elif column in integer_columns:
+            np.save(os.path.join(folder, column + '.npy'), values.to_numpy())
+        else:
+            schema['text'].append(column)
+            write_text(values, folder, column)
+    with open(os.path.join(folder, 'schema.json'), 'w') as f:
+        json.dump(schema, f)
+
+
+def read_columns(folder):
+    # The frame of the coded columns, and the text columns by name
+    with open(os.path.join(folder, 'schema.json')) as f:
+        schema = json.load(f)
+    columns, texts = {}, {}
+    for column in schema['columns']:
+        if column in schema['text']:
+            texts[column] = TextColumn.read(folder, column)
+            continue
+        # Memory-mapped, so the pages of numeric columns are shared by all workers through the OS cache
+        values = np.load(os.path.join(folder, column + '.npy'), mmap_mode='r')
+        if column in schema['categories']:
+            columns[column] = pd.Categorical.from_codes(values, schema['categories'][column])
+        else:
+            columns[column] = pd.Series(values, copy=False)
+    return pd.DataFrame(columns), texts
+
+
+def manifest_file(folder):
+    return os.path.join(folder, 'deltas.json')
+
+
+def read_manifest(folder):
+    # Chain of versions: the base csv followed by every batch of appended rows
+    with open(manifest_file(folder)) as f:
+        return json.load(f)['versions']
+
+
+def write_folder(df, folder):
+    # Writing next to the final folder and renaming it, so readers never see a partial folder
+    os.makedirs(os.path.dirname(folder), exist_ok=True)
+    tmp_folder = tempfile.mkdtemp(dir=os.path.dirname(folder))
+    write_columns(df, tmp_folder)
+    try:
+        os.rename(tmp_folder, folder)
+    except OSError:
+        # Another worker has written the same version in the meantime
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+
+
+def append_to_store(dataset, new_df):
+    # Storing new rows as a column segment after the current version, running workers pick it up with refresh()
+    sha = hashlib.sha1(dataset.version.encode())
+    sha.update(new_df.to_csv(index=False).encode())
+    version = sha.hexdigest()[:16]
+
+    columns = list(dataset.df.columns) + list(dataset.texts)
+    write_folder(typed_frame(new_df[columns]), os.path.join(dataset.folder, 'deltas', version))
+    try:
+        versions = read_manifest(dataset.folder)
+    except OSError:
+        versions = [os.path.basename(dataset.folder)]
+    versions = versions[:versions.index(dataset.version) + 1] + [version]
+    # Replacing the manifest in one step is what makes the new version visible
+    write_atomic(manifest_file(dataset.folder), json.dumps({'versions': versions}).encode())
+    return version
+
+
+def prune_versions(folder, max_versions, current):
+    # Removing the folders written in an older layout, and those of the least recently loaded versions past
+    # max_versions, never the current one nor the temporary folders being written. Workers still running an
+    # older version keep their mapped pages
+    def mtime(name):
+        try:
+            return os.path.getmtime(os.path.join(folder, name))
+        except OSError:
+            return 0
+    names = [name for name in os.listdir(folder)
+             if name != current and not name.startswith('tmp') and os.path.isdir(os.path.join(folder, name))]
+    stale = [name for name in names if not name.endswith('-' + store_format)]
+    names = sorted(set(names) - set(stale), key=mtime, reverse=True)
+    for name in stale + names[max(max_versions - 1, 0):]:
+        shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
+
+
+def load_dataset(file_name=None, folder=None, base=False):
+    # Reading the columnar cache for this version of the csv (creating it on first load),
+    # followed by the rows appended since, unless base is set
+    file_name = file_name or path + 'merged.csv'
+    version = '{}-{}'.format(file_hash(file_name), store_format)
+    cache_folder = os.path.join(folder or cache_path, 'dataset', version)
+
+    if not os.path.exists(os.path.join(cache_folder, 'schema.json')):
+        write_folder(typed_frame(pd.read_csv(file_name)), cache_folder)
+    # Marking the version as used, the others are removed past max_versions
+    os.utime(cache_folder)
+    prune_versions(os.path.dirname(cache_folder), max_versions, version)
+
+    dataset = Dataset(*read_columns(cache_folder), version, cache_folder)
+    return dataset if base else dataset.refresh(interval=0)
@@ -0,0 +1,132 @@
+import os
+import json
+import sqlite3
+import threading
+from functools import wraps
+from collections import OrderedDict, defaultdict
+
+from plotly.utils import PlotlyJSONEncoder
+
+from functions import cache_path
+from figures import to_json, from_json
+
+# 'memory' keeps an LRU per process, 'sqlite' adds a database shared by all workers, 'off' disables caching
+backend = os.environ.get('NOBEL_FIGURE_CACHE', 'memory')
+max_bytes = int(os.environ.get('NOBEL_FIGURE_CACHE_BYTES', 64 * 1024 * 1024))
+max_shared_entries = int(os.environ.get('NOBEL_FIGURE_CACHE_SHARED_ENTRIES', 20000))
+
+
+class SharedStore:
+    # Serialized callback outputs in one sqlite file, oldest entries are dropped first
+
+    def __init__(self, file_name, max_entries):
+        self.file_name = file_name
+        self.max_entries = max_entries
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        with self.connection() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS figures (key TEXT PRIMARY KEY, value TEXT)')
+
+    def connection(self):
+        # sqlite connections cannot be shared between threads or forked workers
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.file_name, timeout=5)
+            db.execute('PRAGMA journal_mode=WAL')
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def get(self, key):
+        row = self.connection().execute('SELECT value FROM figures WHERE key=?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value):
+        with self.connection() as db:
+            cursor = db.execute('INSERT OR REPLACE INTO figures (key, value) VALUES (?, ?)', (key, value))
+            if cursor.lastrowid % 100 == 0:
+                db.execute('DELETE FROM figures WHERE rowid <= ?', (cursor.lastrowid - self.max_entries,))
+
+    def clear(self):
+        with self.connection() as db:
+            db.execute('DELETE FROM figures')
+
+
+class FigureCache:
+    # Callback outputs memoized as JSON, keyed by callback name, inputs and dataset version
+
+    def __init__(self, version, backend=backend, max_bytes=max_bytes, folder=None):
+        self.version = version
+        self.enabled = backend != 'off'
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = defaultdict(lambda: {'hits': 0, 'shared_hits': 0, 'misses': 0})
+        self.shared = None
+        if backend == 'sqlite':
+            self.shared = SharedStore(os.path.join(folder or cache_path, 'figures.sqlite'), max_shared_entries)
+
+    def key(self, name, args):
+        return json.dumps([self.version, name, args], cls=PlotlyJSONEncoder)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            if key in self._entries:
+                self.size -= len(self._entries.pop(key))
+            self._entries[key] = value
+            self.size += len(value)
+            # Least recently used entries go first, so popular inputs survive slider sweeps
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                self.size -= len(self._entries.popitem(last=False)[1])
+
+    def seed(self, name, args, value):
+        # Adding an already serialized output, e.g. a prebuilt snapshot for the default inputs
+        if self.enabled:
+            self.set(self.key(name, list(args)), value)
+
+    def memoize(self, name, shared=True):
+        # shared=False keeps a callback in the per-process LRU only, for very large input spaces
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args):
+                if not self.enabled:
+                    return function(*args)
+                counter = self.counters[name]
+                key = self.key(name, args)
+                value = self.get(key)
+                if value is not None:
+                    counter['hits'] += 1
+                    return from_json(value)
+                if shared and self.shared is not None:
+                    value = self.shared.get(key)
+                    if value is not None:
+                        counter['shared_hits'] += 1
+                        self.set(key, value)
+                        return from_json(value)
+                counter['misses'] += 1
+                result = function(*args)
+                value = to_json(result)
+                self.set(key, value)
+                if shared and self.shared is not None:
+                    self.shared.set(key, value)
+                return result
+            return wrapper
+        return decorator
+
+    def stats(self):
+        return {'entries': len(self._entries), 'bytes': self.size,
+                'callbacks': {name: dict(counter) for name, counter in self.counters.items()}}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+        if self.shared is not None:
+            self.shared.clear()
@@ -0,0 +1,123 @@
+import os
+import re
+import json
+import base64
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from plotly.utils import PlotlyJSONEncoder
+
+# orjson is optional, it writes the plain figures several times faster than the json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# With NOBEL_FAST_FIGURES=1 the callbacks return plain dict figures instead of go.Figure objects (no
+# validation of every property), and numeric arrays of at least NOBEL_TYPED_ARRAY_MIN values are sent as
+# plotly.js typed arrays (base64 data in a {'dtype', 'bdata'} object) instead of decimal text, when the
+# plotly.js that Dash serves reads them (2.28 or later)
+fast_figures = os.environ.get('NOBEL_FAST_FIGURES', '0') == '1'
+typed_array_min = int(os.environ.get('NOBEL_TYPED_ARRAY_MIN', 16))
+
+# Array types of plotly.js, integers are sent in the narrowest of them
+typed_array_dtypes = {'i1', 'u1', 'i2', 'u2', 'i4', 'u4', 'f4', 'f8'}
+# First plotly.js that reads typed arrays, with an older one the arrays are sent as text
+typed_array_plotlyjs = (2, 28)
+
+
+@lru_cache(maxsize=None)
+def plotlyjs_version():
+    # plotly.js served by Dash: the bundle of plotly.py since Dash 2.17, before that the one of dash.dcc
+    import dash
+    if hasattr(dash.Dash, '_setup_plotlyjs'):
+        from plotly.offline import get_plotlyjs_version
+        version = get_plotlyjs_version()
+    else:
+        with open(os.path.join(os.path.dirname(dash.dcc.__file__), 'plotly.min.js'), encoding='utf-8') as f:
+            match = re.search(r'plotly\.js v(\d+\.\d+\.\d+)', f.read(1000))
+        version = match.group(1) if match else '0.0.0'
+    return tuple(int(part) for part in version.split('.'))
+
+
+def typed_arrays():
+    return typed_array_plotlyjs <= plotlyjs_version()[:2]
+
+
+def typed_array(values):
+    # A numeric array as a plotly.js typed array, other values as they are
+    if isinstance(values, (pd.Series, pd.Index)):
+        values = values.to_numpy()
+    if not isinstance(values, np.ndarray):
+        return values
+    if (values.dtype.kind not in 'iuf' or values.ndim != 1 or len(values) < typed_array_min
+            or not typed_arrays()):
+        return values.tolist()
+    if values.dtype.kind in 'iu':
+        # The narrowest integer type of the values, e.g. one byte per age instead of about three characters
+        for dtype in [np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32, np.float64]:
+            if dtype == np.float64 or np.iinfo(dtype).min <= values.min() and values.max() <= np.iinfo(dtype).max:
+                values = values.astype(dtype)
+                break
+    values = values.astype(values.dtype.newbyteorder('<'))
+    dtype = values.dtype.str[1:]
+    if dtype not in typed_array_dtypes:
+        values, dtype = values.astype('<f8'), 'f8'
+    return {'dtype': dtype, 'bdata': base64.b64encode(values.tobytes()).decode()}
+
+
+def encode_arrays(value):
+    if isinstance(value, dict):
+        return {key: encode_arrays(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], dict):
+        return [encode_arrays(item) for item in value]
+    if isinstance(value, (list, tuple)) and len(value) >= typed_array_min and all(
+            isinstance(item, (int, float)) and not isinstance(item, bool) for item in value):
+        return typed_array(np.asarray(value))
+    return typed_array(value)
+
+
+@lru_cache(maxsize=None)
+def default_template():
+    # Template that go.Figure adds to the layout, so that both kinds of figures look the same
+    import plotly.io as pio
+    return pio.templates[pio.templates.default].to_plotly_json()
+
+
+def make_figure(data, layout):
+    # data: trace dicts with their type, layout: a dict, both with nested properties (marker=dict(color=...),
+    # not marker_color) as plotly.js expects them
+    if not fast_figures:
+        import plotly.graph_objects as go
+        return go.Figure(data=data, layout=layout)
+    return {'data': [encode_arrays(trace) for trace in data],
+            'layout': dict(encode_arrays(layout), template=default_template())}
+
+
+def make_patch(updates, trace=None):
+    # Patch setting these properties of the figure (or of one of its traces), only they are sent to the browser
+    from dash import Patch
+    patch = Patch()
+    target = patch if trace is None else patch['data'][trace]
+    for key, value in updates.items():
+        if fast_figures:
+            value = encode_arrays(value)
+        elif hasattr(value, 'tolist'):
+            value = value.tolist()
+        target[key] = value
+    return patch
+
+
+def to_json(value):
+    # orjson for plain values and figures, plotly's encoder when there are go.Figure objects
+    if fast_figures and orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+        except TypeError:
+            pass
+    return json.dumps(value, cls=PlotlyJSONEncoder)
+
+
+def from_json(value):
+    return orjson.loads(value) if orjson is not None else json.loads(value)
@@ -1,17 +1,20 @@
+import os
+import base64
+import hashlib
+import tempfile
+from functools import lru_cache
+
 import pandas as pd
 import numpy as np
 
-import matplotlib.pyplot as plt
-import seaborn as sb
-import plotly.graph_objects as go
-
-import geojson
-import country_converter as coco # to convert and match country names
-from wordcloud import WordCloud, STOPWORDS
+# geojson, country_converter and wordcloud are slow to import, so they are imported on first use
 
-path = 'data/'
+# NOBEL_DATA_PATH points the app at another data folder, e.g. one written by scale_data.py
+path = os.path.join(os.environ.get('NOBEL_DATA_PATH', 'data'), '')
+cache_path = os.environ.get('NOBEL_CACHE_PATH', 'cache/')
 
 def get_data_geo(): # not used
+    import geojson
     with open(path+'countries.geojson') as f:
         data_geo = geojson.load(f)
     # In order to feed the GeoJson into Plotly,
@@ -22,27 +25,120 @@ def get_data_geo(): # not used
     return data_geo
 
 
-def make_density_df(df):
-    # Grouping the dataset by country and counting cases
-    df_by_country = df[['id', 'bornCountryCode']].groupby('bornCountryCode').count().rename(columns={"id": "count"})
-
+@lru_cache(maxsize=None)
+def get_country_table():
+    # Country reference data, read once per process. Rows without a code (Namibia's 'NA' is read as NaN) are dropped
     df_country_points = pd.read_csv(path+'country_points.csv')
     df_country = df_country_points.rename(columns={'country' : 'iso-a2'})
+    return df_country.dropna(subset=['iso-a2'])
+
+
+@lru_cache(maxsize=None)
+def country_converter():
+    import country_converter as coco # to convert and match country names
+    return coco.CountryConverter()
 
-    df_density = pd.merge(df_country, df_by_country, left_on='iso-a2', right_on='bornCountryCode')
-    df_density.sort_values(by=['count'], inplace=True)
 
-    cc = coco.CountryConverter()
-    df_density['iso-a3'] = cc.convert(df_density['iso-a2'], to='ISO3')
+@lru_cache(maxsize=None)
+def iso_a3(code):
+    # ISO-A3 code of an ISO-A2 one, None when there is none (e.g. AN and GZ)
+    converted = country_converter().convert(code, to='ISO3', not_found=None)
+    return None if converted == code else converted
+
+
+def with_iso_a3(df_country):
+    # ISO-A3 codes of the countries matched with the laureates, applied after the merge so that codes no
+    # laureate has are never converted (nor reported as not found). Countries without one are dropped
+    df_country = df_country.assign(**{'iso-a3': [iso_a3(code) for code in df_country['iso-a2']]})
+    return df_country.loc[df_country['iso-a3'].notna()].copy()
+
+
+def make_density_from_counts(df_by_country):
+    # df_by_country: 'count' column indexed by the ISO-A2 code of the country of birth
+    df_density = with_iso_a3(pd.merge(get_country_table(), df_by_country, left_on='iso-a2', right_on='bornCountryCode'))
+    df_density.sort_values(by=['count'], inplace=True)
     
     return df_density
 
 
-def plot_wordcloud(text):
-    stopwords = set(STOPWORDS)
-    wc = WordCloud(stopwords=stopwords,
-                   background_color='white', colormap='copper').generate(text) #width=480, height=360
-    return wc.to_image()
+def word_frequencies(terms, counts):
+    # Word counts as WordCloud.process_text would give them for the text behind counts (without collocations):
+    # stopwords removed, plurals added to their singular, each word shown in its most frequent spelling
+    from wordcloud import STOPWORDS
+    stopwords = {word.lower() for word in STOPWORDS}
+    spellings = {}
+    for term in np.flatnonzero(counts):
+        word = terms[term]
+        key = word.lower()
+        if key not in stopwords:
+            spellings.setdefault(key, {})[word] = int(counts[term])
+
+    for key in list(spellings):
+        if key.endswith('s') and not key.endswith('ss') and key[:-1] in spellings:
+            singular = spellings[key[:-1]]
+            for word, count in spellings.pop(key).items():
+                singular[word[:-1]] = singular.get(word[:-1], 0) + count
+
+    return {max(words, key=words.get): sum(words.values()) for words in spellings.values()}
+
+
+def plot_wordcloud(frequencies, layout=None, **options):
+    # options override the WordCloud settings. The layout of an earlier cloud (wc.layout_) can be
+    # passed to draw the same words again without placing them
+    from wordcloud import WordCloud
+    wc = WordCloud(background_color='white', colormap='copper', **options) #width=480, height=360
+    if layout is not None or not frequencies:
+        # No motivations in the selection, e.g. no laureates of the chosen genders in these years, gives a blank image
+        wc.layout_ = layout or []
+        return wc
+    return wc.generate_from_frequencies(frequencies)
+
+
+def make_choropleth_cube(dataset):
+    # Individual laureates per (year, category, country), shipped once so the map can be filtered in the browser
+    counts = np.diff(dataset.year_counts[:-1], axis=1) # (category, year, country)
+
+    df_codes = pd.DataFrame({'iso-a2': dataset.country_codes, 'position': np.arange(len(dataset.country_codes))})
+    df_country = with_iso_a3(pd.merge(get_country_table(), df_codes, on='iso-a2'))
+    counts = counts[:, :, df_country['position'].to_numpy()]
+
+    # Keeping only the countries that have at least one laureate
+    found = counts.sum(axis=(0, 1)) > 0
+    counts = counts[:, :, found].transpose(1, 0, 2)
+    df_country = df_country.loc[found]
+
+    dtype = 'uint8' if counts.max() < 256 else 'uint16'
+    return {'years': [int(dataset.years[0]), int(dataset.years[-1])],
+            'categories': dataset.categories,
+            'locations': df_country['iso-a3'].tolist(),
+            'names': df_country['name'].tolist(),
+            'dtype': dtype,
+            'counts': base64.b64encode(np.ascontiguousarray(counts, dtype=dtype).tobytes()).decode()}
+
+
+def file_hash(*file_names):
+    # Hashing the raw bytes of data (or source) files, used as a version key for cached results
+    sha = hashlib.sha1()
+    for file_name in file_names:
+        with open(file_name, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                sha.update(chunk)
+    return sha.hexdigest()[:16]
+
+
+def write_atomic(file_name, content):
+    # Writing to a temporary file first, so that other workers never read a half-written file
+    folder = os.path.dirname(file_name)
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_name, file_name)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
 
 
 def split_long_label(label, limit=20, separator=' '):
@@ -0,0 +1,65 @@
+import os
+from io import BytesIO
+
+from functions import cache_path, file_hash, write_atomic
+from wordclouds import cacheable_response
+
+# Size of the longest side of the optimized images, about twice the width of the panel they are shown in
+display_size = int(os.environ.get('NOBEL_IMAGE_SIZE', 640))
+
+
+def optimize_image(file_name, size=display_size, background='white'):
+    # Downscaled WebP copy of a large PNG, flattened onto the panel background (the alpha channel
+    # alone is more than half of the file size)
+    from PIL import Image
+    with Image.open(file_name) as img:
+        img = img.convert('RGBA')
+        img.thumbnail((size, size), Image.LANCZOS)
+        flat = Image.new('RGB', img.size, background)
+        flat.paste(img, mask=img.split()[3])
+    content = BytesIO()
+    flat.save(content, format='WEBP', quality=80, method=6)
+    return content.getvalue()
+
+
+class OptimizedImages:
+    # WebP copies of images from the assets folder, stored in <cache_path>/images/ and keyed by the source file hash
+
+    def __init__(self, names, source_folder='assets/', folder=None):
+        self.source_folder = source_folder
+        self.folder = os.path.join(folder or cache_path, 'images')
+        self.versions = {name: file_hash(self.source_file(name)) for name in names}
+        self._content = {}
+
+    @staticmethod
+    def slug(name):
+        return name.replace(' ', '_')
+
+    def source_file(self, name):
+        return os.path.join(self.source_folder, name + '.png')
+
+    def file_name(self, name):
+        return os.path.join(self.folder, '{}.{}.webp'.format(self.slug(name), self.versions[name]))
+
+    def url(self, name):
+        return '/images/{}.webp?v={}'.format(self.slug(name), self.versions[name])
+
+    def content(self, name):
+        if name not in self._content:
+            file_name = self.file_name(name)
+            if os.path.exists(file_name):
+                with open(file_name, 'rb') as f:
+                    self._content[name] = f.read()
+            else:
+                self._content[name] = optimize_image(self.source_file(name))
+                write_atomic(file_name, self._content[name])
+        return self._content[name]
+
+    def response(self, name, request):
+        content = self.content(name)
+        return cacheable_response(content, 'image/webp', self.versions[name],
+                                  os.path.getmtime(self.file_name(name)), request)
+
+    def build(self):
+        for name in self.versions:
+            self.content(name)
@@ -0,0 +1,169 @@
+import os
+import time
+import logging
+import cProfile
+import threading
+from functools import wraps
+from collections import defaultdict
+
+from flask import Response, g
+from dash import callback_context
+from dash.exceptions import MissingCallbackContextException
+
+from functions import cache_path
+
+logger = logging.getLogger(__name__)
+
+# With NOBEL_PROFILE_SLOW_MS set, callbacks run under cProfile and the profiles of those slower than
+# that many milliseconds are written to <cache_path>/profiles/ (for snakeviz or pstats)
+profile_slow_ms = float(os.environ.get('NOBEL_PROFILE_SLOW_MS', 0))
+
+# Upper bounds of the latency histogram, in seconds
+latency_buckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+# Phases of a callback request: the callback marks the first three (see mark), serialize is the time
+# Dash takes after the callback has returned, other is the unmarked rest (e.g. reading a cached figure)
+phases = ['filter', 'aggregate', 'figure', 'serialize', 'other']
+
+
+def in_callback_request():
+    # Dash sets the callback context only while it dispatches a callback request. Before the first
+    # one the context variable does not even exist
+    try:
+        callback_context.outputs_list
+    except (MissingCallbackContextException, LookupError):
+        return False
+    return True
+
+
+class CallbackMetrics:
+    # Latency, phases and response size of the Dash callbacks, in the Prometheus text format.
+    # The numbers are per process, so with several gunicorn workers each scrape sees one worker
+
+    def __init__(self, figure_cache=None, profile_slow_ms=profile_slow_ms, folder=None):
+        self.figure_cache = figure_cache
+        self.profile_slow_ms = profile_slow_ms
+        self.profile_folder = os.path.join(folder or cache_path, 'profiles')
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.buckets = defaultdict(lambda: [0] * len(latency_buckets))
+        self.phase_seconds = defaultdict(float)
+        self.response_bytes = defaultdict(int)
+        self.slow_calls = defaultdict(int)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def instrument(self, name):
+        # Timing a callback when it runs for a callback request, not when it builds a snapshot
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args):
+                if not in_callback_request():
+                    return function(*args)
+                record = {'name': name, 'start': time.perf_counter(), 'phases': defaultdict(float)}
+                record['last'] = record['start']
+                self._local.record = record
+                profile = cProfile.Profile() if self.profile_slow_ms else None
+                try:
+                    if profile is not None:
+                        profile.enable()
+                    return function(*args)
+                finally:
+                    if profile is not None:
+                        profile.disable()
+                    self._local.record = None
+                    record['seconds'] = time.perf_counter() - record['start']
+                    record['phases']['other'] += record['seconds'] - sum(record['phases'].values())
+                    g.callback_metrics = record
+                    if profile is not None and 1000 * record['seconds'] > self.profile_slow_ms:
+                        self.dump_profile(record, profile)
+            return wrapper
+        return decorator
+
+    def mark(self, phase):
+        # Time since the start of the callback or the previous mark, added to phase
+        record = getattr(self._local, 'record', None)
+        if record is not None:
+            now = time.perf_counter()
+            record['phases'][phase] += now - record['last']
+            record['last'] = now
+
+    def dump_profile(self, record, profile):
+        os.makedirs(self.profile_folder, exist_ok=True)
+        file_name = os.path.join(self.profile_folder, '{}-{}-{}.prof'.format(
+            record['name'], time.strftime('%Y%m%d-%H%M%S'), os.getpid()))
+        profile.dump_stats(file_name)
+        self.slow_calls[record['name']] += 1
+        logger.warning('Slow callback %s: %.0f ms, profile written to %s',
+                       record['name'], 1000 * record['seconds'], file_name)
+
+    def after_request(self, response):
+        # Adding the serialization by Dash and the size of the response to the timing of the callback
+        record = g.pop('callback_metrics', None)
+        if record is None:
+            return response
+        name = record['name']
+        seconds = time.perf_counter() - record['start']
+        with self._lock:
+            self.calls[name] += 1
+            self.seconds[name] += seconds
+            buckets = self.buckets[name]
+            for i, bound in enumerate(latency_buckets):
+                if seconds <= bound:
+                    buckets[i] += 1
+            for phase, phase_seconds in record['phases'].items():
+                self.phase_seconds[(name, phase)] += phase_seconds
+            self.phase_seconds[(name, 'serialize')] += seconds - record['seconds']
+            self.response_bytes[name] += response.calculate_content_length() or 0
+        return response
+
+    def prometheus(self):
+        lines = ['# HELP nobel_callback_duration_seconds Time from the start of a callback to its serialized response',
+                 '# TYPE nobel_callback_duration_seconds histogram']
+        for name in sorted(self.calls):
+            for bound, count in zip(latency_buckets, self.buckets[name]):
+                lines.append('nobel_callback_duration_seconds_bucket{{callback="{}",le="{}"}} {}'.format(name, bound, count))
+            lines.append('nobel_callback_duration_seconds_bucket{{callback="{}",le="+Inf"}} {}'.format(name, self.calls[name]))
+            lines.append('nobel_callback_duration_seconds_sum{{callback="{}"}} {:.6f}'.format(name, self.seconds[name]))
+            lines.append('nobel_callback_duration_seconds_count{{callback="{}"}} {}'.format(name, self.calls[name]))
+
+        lines += ['# HELP nobel_callback_phase_seconds_total Time spent per phase of the callbacks',
+                  '# TYPE nobel_callback_phase_seconds_total counter']
+        for name in sorted(self.calls):
+            for phase in phases:
+                lines.append('nobel_callback_phase_seconds_total{{callback="{}",phase="{}"}} {:.6f}'.format(
+                    name, phase, self.phase_seconds[(name, phase)]))
+
+        lines += ['# HELP nobel_callback_response_bytes_total Size of the callback responses',
+                  '# TYPE nobel_callback_response_bytes_total counter']
+        for name in sorted(self.calls):
+            lines.append('nobel_callback_response_bytes_total{{callback="{}"}} {}'.format(name, self.response_bytes[name]))
+
+        lines += ['# HELP nobel_callback_slow_total Callbacks slower than NOBEL_PROFILE_SLOW_MS, with a profile written',
+                  '# TYPE nobel_callback_slow_total counter']
+        for name in sorted(self.slow_calls):
+            lines.append('nobel_callback_slow_total{{callback="{}"}} {}'.format(name, self.slow_calls[name]))
+
+        if self.figure_cache is not None:
+            stats = self.figure_cache.stats()
+            lines += ['# HELP nobel_figure_cache_requests_total Lookups of the figure cache by result',
+                      '# TYPE nobel_figure_cache_requests_total counter']
+            for name, counter in sorted(stats['callbacks'].items()):
+                for result in ['hits', 'shared_hits', 'misses']:
+                    lines.append('nobel_figure_cache_requests_total{{callback="{}",result="{}"}} {}'.format(
+                        name, result, counter[result]))
+            lines += ['# HELP nobel_figure_cache_hit_ratio Share of the lookups answered from memory or the shared store',
+                      '# TYPE nobel_figure_cache_hit_ratio gauge']
+            for name, counter in sorted(stats['callbacks'].items()):
+                total = counter['hits'] + counter['shared_hits'] + counter['misses']
+                lines.append('nobel_figure_cache_hit_ratio{{callback="{}"}} {:.4f}'.format(
+                    name, (counter['hits'] + counter['shared_hits']) / total if total else 0))
+            lines += ['# HELP nobel_figure_cache_bytes Size of the serialized figures kept in memory',
+                      '# TYPE nobel_figure_cache_bytes gauge',
+                      'nobel_figure_cache_bytes {}'.format(stats['bytes']),
+                      '# HELP nobel_figure_cache_entries Number of figures kept in memory',
+                      '# TYPE nobel_figure_cache_entries gauge',
+                      'nobel_figure_cache_entries {}'.format(stats['entries'])]
+        return '\n'.join(lines) + '\n'
+
+    def response(self):
+        return Response(self.prometheus(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,86 @@
+# Adding new laureates from a file in the shape of the nobelprize.org API (v1, laureate.json):
+#   python refresh.py laureates.json
+# Only the laureate prizes that are not in the dataset yet are appended to the columnar store,
+# running workers pick them up within a second, without a restart.
+import sys
+import json
+
+import numpy as np
+import pandas as pd
+
+from dataset import load_dataset, append_to_store
+
+
+def year_of(date):
+    # API dates look like '1845-03-27', with '0000-00-00' for unknown dates (0 is also used for the living)
+    try:
+        return int(str(date)[:4])
+    except ValueError:
+        return 0
+
+
+def laureates_from_api(data):
+    # One row per (laureate, prize) with the first affiliation, as in merged.csv
+    rows = []
+    for laureate in data['laureates']:
+        born = year_of(laureate.get('born'))
+        for prize in laureate.get('prizes', []):
+            affiliations = [a for a in prize.get('affiliations', []) if isinstance(a, dict) and a]
+            affiliation = affiliations[0] if affiliations else {}
+            year = int(prize['year'])
+            rows.append({'id': int(laureate['id']),
+                         'firstname': laureate.get('firstname'),
+                         'surname': laureate.get('surname'),
+                         'born': born,
+                         'died': year_of(laureate.get('died')),
+                         'bornCountry': laureate.get('bornCountry'),
+                         'bornCountryCode': laureate.get('bornCountryCode'),
+                         'bornCity': laureate.get('bornCity'),
+                         'diedCountry': laureate.get('diedCountry'),
+                         'diedCountryCode': laureate.get('diedCountryCode'),
+                         'diedCity': laureate.get('diedCity'),
+                         'gender': laureate.get('gender'),
+                         'year': year,
+                         'category': prize['category'],
+                         'overallMotivation': prize.get('overallMotivation'),
+                         'share': int(prize.get('share', 1)),
+                         'motivation': prize.get('motivation'),
+                         'name': affiliation.get('name'),
+                         'city': affiliation.get('city'),
+                         'country': affiliation.get('country'),
+                         'prizeAge': year - born if born else 0})
+    return pd.DataFrame(rows).replace({None: np.nan})
+
+
+def known_ages(laureates):
+    # Individuals whose birth year is unknown have no prize age, their prizes are left out (and reported)
+    # instead of getting into the age statistics. Organisations are kept, their ages are not used
+    unknown = (laureates['born'] == 0) & (laureates['gender'] != 'org')
+    return laureates.loc[~unknown], laureates.loc[unknown]
+
+
+def new_laureates(dataset, laureates):
+    # Dropping the prizes that are already in the dataset, identified by (id, year, category)
+    existing = set(zip(dataset.df['id'], dataset.df['year'], dataset.df['category'].astype(str)))
+    is_new = [key not in existing for key in zip(laureates['id'], laureates['year'], laureates['category'])]
+    return laureates.loc[is_new].drop_duplicates(['id', 'year', 'category'])
+
+
+def main(file_name):
+    with open(file_name) as f:
+        laureates = laureates_from_api(json.load(f))
+    laureates, unknown = known_ages(laureates)
+    for _, row in unknown.iterrows():
+        print('Skipped {} {} ({} {}): unknown birth year'.format(row['firstname'], row['surname'], row['category'], row['year']))
+    dataset = load_dataset()
+    new_df = new_laureates(dataset, laureates)
+    if new_df.empty:
+        print('No new laureates in {}, dataset version stays {}'.format(file_name, dataset.version))
+        return
+    version = append_to_store(dataset, new_df)
+    print('Appended {} rows ({}), dataset version {}'.format(
+        len(new_df), ', '.join(sorted(new_df['category'].unique())), version))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1])
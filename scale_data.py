@@ -0,0 +1,76 @@
+# Synthetic versions of data/merged.csv with more laureates, to see how the app behaves with larger datasets:
+#   python scale_data.py --scale 100 --output data/scale-100/
+#   NOBEL_DATA_PATH=data/scale-100/ gunicorn app:server
+# Rows are drawn from the real ones, so categories, years, countries of birth, genders and ages keep their
+# joint distribution. Names, institutions and motivations are recombined, so that their number of distinct
+# values grows with the scale, as it would in a larger award or affiliation dataset.
+import os
+import math
+import shutil
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from functions import path
+
+
+def scale_laureates(df, scale, seed=0):
+    rng = np.random.default_rng(seed)
+    n = int(round(len(df) * scale))
+    sample = df.iloc[rng.integers(0, len(df), n)].reset_index(drop=True)
+    sample['id'] = np.arange(1, n + 1)
+
+    # Individuals get the first name and the surname of two other individuals, organisations keep their name
+    individual = (sample['gender'] != 'org').to_numpy()
+    people = df[(df['gender'] != 'org') & df['surname'].notna()]
+    for column in ['firstname', 'surname']:
+        sample.loc[individual, column] = people[column].to_numpy()[rng.integers(0, len(people), individual.sum())]
+
+    # Individuals born up to 5 years earlier or later, awarded in the same year
+    shift = rng.integers(-5, 6, n) * individual
+    sample['born'] = sample['born'] - shift
+    sample['prizeAge'] = sample['prizeAge'] + shift
+
+    # About sqrt(scale) institutions (e.g. campuses) for each real one
+    campus = rng.integers(0, math.ceil(math.sqrt(scale)), n)
+    has_campus = sample['name'].notna().to_numpy() & (campus > 0)
+    sample.loc[has_campus, 'name'] = [name + ' - Campus ' + str(k) for name, k in
+                                      zip(sample.loc[has_campus, 'name'], campus[has_campus])]
+
+    # One word of the motivation replaced by a word of another motivation, drawn as often as it is used.
+    # The first and the last words keep the quotes around the text
+    words = df['motivation'].str.split(' ')
+    vocabulary = np.concatenate([w[1:-1] for w in words if len(w) > 2])
+    base = words.to_numpy()[rng.integers(0, len(df), n)]
+    replacements = vocabulary[rng.integers(0, len(vocabulary), n)]
+    positions = rng.random(n)
+    motivations = []
+    for w, replacement, position in zip(base, replacements, positions):
+        if len(w) > 2:
+            i = 1 + int(position * (len(w) - 2))
+            w = w[:i] + [replacement] + w[i + 1:]
+        motivations.append(' '.join(w))
+    sample['motivation'] = motivations
+    return sample
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthetic merged.csv with more laureates')
+    parser.add_argument('--scale', type=float, required=True, help='number of rows as a multiple of the real data')
+    parser.add_argument('--output', required=True, help='data folder to write, to use with NOBEL_DATA_PATH')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = pd.read_csv(path + 'merged.csv')
+    scaled = scale_laureates(df, args.scale, args.seed)
+    os.makedirs(args.output, exist_ok=True)
+    scaled.to_csv(os.path.join(args.output, 'merged.csv'), index=False)
+    # The reference data of the countries is the same
+    shutil.copy(path + 'country_points.csv', os.path.join(args.output, 'country_points.csv'))
+    print('{} laureates ({} institutions, {} motivations) written to {}'.format(
+        len(scaled), scaled['name'].nunique(), scaled['motivation'].nunique(), args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import os
+import json
+import threading
+
+from plotly.utils import PlotlyJSONEncoder
+
+from functions import cache_path, write_atomic
+
+
+class FigureSnapshots:
+    # Prebuilt figures stored as JSON in <cache_path>/snapshots/, each with the data version it was built from
+
+    def __init__(self, version, folder=None):
+        self.version = version
+        self.folder = os.path.join(folder or cache_path, 'snapshots')
+        self._values = {}
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def file_name(self, name):
+        return os.path.join(self.folder, name + '.json')
+
+    def load(self, name):
+        # Serialized value of a snapshot, or None when it is missing or was built from other data
+        try:
+            with open(self.file_name(name)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if snapshot.get('version') != self.version:
+            return None
+        return json.dumps(snapshot['value'])
+
+    def build(self, name, make_value):
+        value = json.dumps(make_value(), cls=PlotlyJSONEncoder)
+        content = '{{"version": {}, "value": {}}}'.format(json.dumps(self.version), value)
+        write_atomic(self.file_name(name), content.encode())
+        return value
+
+    def get_json(self, name, make_value):
+        # Loading the snapshot once per process, regenerating it when the data has changed
+        with self._lock:
+            if name not in self._values:
+                self._values[name] = self.load(name) or self.build(name, make_value)
+            return self._values[name]
+
+    def get(self, name, make_value):
+        if name not in self._objects:
+            self._objects[name] = json.loads(self.get_json(name, make_value))
+        return self._objects[name]
+
+    def build_all(self, makers):
+        for name, make_value in makers.items():
+            self.build(name, make_value)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The tests import the app modules and read data/ relative to the repository root, as the app does
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+os.chdir(root)
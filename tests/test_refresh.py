@@ -0,0 +1,93 @@
+import os
+import json
+
+import pandas as pd
+import pytest
+
+from functions import path
+from dataset import load_dataset, append_to_store
+from refresh import laureates_from_api, known_ages, new_laureates
+
+fixture = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'laureates.json')
+
+
+def fixture_laureates():
+    with open(fixture) as f:
+        return laureates_from_api(json.load(f))
+
+
+@pytest.fixture
+def datasets(tmp_path):
+    # The dataset with the new laureates of the fixture appended to the store, and the same rows loaded from one csv
+    base = load_dataset(folder=str(tmp_path / 'store'))
+    laureates, _ = known_ages(fixture_laureates())
+    new_df = new_laureates(base, laureates)
+    append_to_store(base, new_df)
+    incremental = load_dataset(folder=str(tmp_path / 'store'))
+
+    file_name = str(tmp_path / 'merged.csv')
+    pd.concat([pd.read_csv(path + 'merged.csv'), new_df], ignore_index=True).to_csv(file_name, index=False)
+    full = load_dataset(file_name, folder=str(tmp_path / 'full'))
+    return base, new_df, incremental, full
+
+
+def test_laureates_from_api():
+    laureates = fixture_laureates()
+    assert list(laureates.columns) == list(pd.read_csv(path + 'merged.csv', nrows=0).columns)
+    agostini = laureates[laureates['surname'] == 'Agostini'].iloc[0]
+    assert (agostini['born'], agostini['year'], agostini['prizeAge']) == (1941, 2023, 82)
+    assert pd.isna(laureates[laureates['surname'] == 'Mohammadi'].iloc[0]['name'])
+
+
+def test_unknown_birth_year_is_left_out():
+    laureates, unknown = known_ages(fixture_laureates())
+    assert list(unknown['surname']) == ['Birthdate']
+    assert (laureates['prizeAge'] < 150).all()
+
+
+def test_only_new_prizes_are_appended(datasets):
+    base, new_df, incremental, full = datasets
+    assert sorted(new_df['surname']) == ['Agostini', 'Krausz', "L'Huillier", 'Mohammadi']
+    assert len(incremental.df) == len(base.df) + 4
+    assert incremental.version != base.version
+    assert incremental.changed_categories == {'physics', 'peace'}
+
+
+def test_append_equals_full_rebuild(datasets):
+    _, _, incremental, full = datasets
+    pd.testing.assert_frame_equal(incremental.df.astype(object), full.df.astype(object))
+    assert list(incremental.texts) == list(full.texts)
+    for column in full.texts:
+        pd.testing.assert_series_equal(pd.Series(incremental.texts[column].to_numpy()),
+                                       pd.Series(full.texts[column].to_numpy()))
+    assert list(incremental.years) == list(full.years)
+    assert incremental.categories == full.categories
+
+    # Codes of countries and institutions differ (new values come last in the store), the labeled results do not
+    selections = [{}, {'category': 'physics'}, {'year_range': (1990, 2023)}, {'genders': ['female']},
+                  {'category': 'peace', 'org': False}]
+    for by in [(), ['category'], ['country'], ['institution'], ['year', 'gender'], ['category', 'gender']]:
+        for selection in selections:
+            expected = full.count(by, **selection)
+            result = incremental.count(by, **selection)
+            if by:
+                expected, result = expected.sort_index(), result.sort_index()
+                pd.testing.assert_series_equal(result, expected)
+            else:
+                assert result == expected
+
+    for category in [None] + full.categories:
+        for year_range in [None, (1901, 1950), (2000, 2023)]:
+            pd.testing.assert_frame_equal(incremental.country_counts(category, year_range).sort_index(),
+                                          full.country_counts(category, year_range).sort_index())
+        assert incremental.ages[category] == full.ages[category]
+        pd.testing.assert_frame_equal(incremental.top_universities(category, 20).reset_index(drop=True),
+                                      full.top_universities(category, 20).reset_index(drop=True))
+
+    pd.testing.assert_frame_equal(incremental.gender_by_year, full.gender_by_year)
+    for category in [None, 'physics', 'peace']:
+        for genders in [None, ['female']]:
+            frequencies = [dict(zip(dataset.terms, dataset.term_frequencies(category, (1901, 2023), genders)))
+                           for dataset in (incremental, full)]
+            assert {term: n for term, n in frequencies[0].items() if n} == \
+                   {term: n for term, n in frequencies[1].items() if n}
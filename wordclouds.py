@@ -0,0 +1,266 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import Response
+
+from functions import plot_wordcloud, cache_path, write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Image URLs carry the data version, so browsers and CDNs may keep them for a year
+cache_control = 'public, max-age=31536000, immutable'
+# Number of word clouds kept in memory per process, the others are read back from disk
+max_entries = int(os.environ.get('NOBEL_WORDCLOUD_ENTRIES', 256))
+# Number of word cloud files kept on disk (all versions), the oldest ones are removed past it
+max_files = int(os.environ.get('NOBEL_WORDCLOUD_FILES', 5000))
+
+# 'fast' places fewer words on a half-size canvas and draws it at twice the scale, 'default' keeps the
+# WordCloud settings. Both use a fixed random state, so a selection always gives the same image
+render_mode = os.environ.get('NOBEL_WORDCLOUD_RENDER', 'fast')
+render_options = {'default': {'random_state': 0},
+                  'fast': {'width': 200, 'height': 100, 'scale': 2, 'max_words': 50, 'margin': 1,
+                           'min_font_size': 3, 'random_state': 0}}
+
+# With NOBEL_WORDCLOUD_REUSE_LAYOUT=1, selections with the same top words and about the same weights
+# (rounded to 1/layout_steps of the largest one) are drawn with one layout
+reuse_layout = os.environ.get('NOBEL_WORDCLOUD_REUSE_LAYOUT', '0') == '1'
+layout_steps = 10
+# Settings that change the images, part of the version of the word cloud cache (and so of the image URLs)
+render_settings = render_mode + ('-reuse' if reuse_layout else '')
+
+# Word clouds are rendered by a pool of NOBEL_RENDER_WORKERS processes (0 renders in the request), so the
+# layout does not hold the GIL of a web worker. Requests never wait for a rendering: the page shows the default
+# word cloud meanwhile and checks every NOBEL_RENDER_POLL seconds, for at most NOBEL_RENDER_TIMEOUT seconds
+render_workers = int(os.environ.get('NOBEL_RENDER_WORKERS', 2))
+render_timeout = float(os.environ.get('NOBEL_RENDER_TIMEOUT', 10.0))
+render_poll = float(os.environ.get('NOBEL_RENDER_POLL', 0.25))
+# Images served while a rendering is not done yet must not be kept by the browser
+fallback_cache_control = 'no-store'
+
+
+def cacheable_response(content, mimetype, etag, last_modified, request):
+    # Static image response with validators, answering revalidations with 304 Not Modified
+    response = Response(content, mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control
+    return response.make_conditional(request)
+
+
+def render_wordcloud(frequencies, layout=None, mode=render_mode):
+    # PNG bytes, and the layout of the words to draw another cloud with the same words
+    wc = plot_wordcloud(frequencies, layout, **render_options[mode])
+    img = BytesIO()
+    wc.to_image().save(img, format='PNG')
+    return img.getvalue(), wc.layout_
+
+
+def render_wordcloud_file(file_name, frequencies, layout=None):
+    # Run in the render pool: the PNG is on disk before the result is back, so all workers can serve it
+    content, layout = render_wordcloud(frequencies, layout)
+    write_atomic(file_name, content)
+    return content, layout
+
+
+def prune_files(folder, max_files, keep=()):
+    # Removing the oldest PNG files of a folder and its subfolders past max_files, except the ones in keep
+    files = [os.path.join(directory, name) for directory, _, names in os.walk(folder)
+             for name in names if name.endswith('.png')]
+    if len(files) <= max_files:
+        return
+    def mtime(file_name):
+        try:
+            return os.path.getmtime(file_name)
+        except OSError:
+            return 0
+    candidates = sorted((file_name for file_name in files if file_name not in keep), key=mtime)
+    for file_name in candidates[:len(files) - max_files]:
+        try:
+            os.remove(file_name)
+        except OSError:
+            # Already removed by another worker
+            pass
+
+
+_pool = None
+_pool_pid = None
+
+def render_pool():
+    # One pool per web worker, created on first use so that it is never inherited through a fork.
+    # The processes are forked, as spawned ones would import the main module (app.py when run directly) again
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        context = multiprocessing.get_context('fork')
+        _pool, _pool_pid = ProcessPoolExecutor(render_workers, mp_context=context), os.getpid()
+    return _pool
+
+
+def submit_render(function, *args):
+    if render_workers == 0:
+        future = Future()
+        future.set_result(function(*args))
+        return future
+    try:
+        return render_pool().submit(function, *args)
+    except BrokenProcessPool:
+        # A rendering process has died (e.g. killed for its memory), starting a new pool
+        global _pool
+        _pool = None
+        return render_pool().submit(function, *args)
+
+
+def layout_key(frequencies, mode=render_mode):
+    words = sorted(frequencies.items(), key=lambda item: -item[1])[:render_options[mode].get('max_words', 200)]
+    if not words:
+        return ()
+    return tuple((word, round(layout_steps * count / words[0][1])) for word, count in words)
+
+
+class WordCloudCache:
+    # Word cloud PNGs per selection (category, first year, last year, genders), stored in
+    # <cache_path>/wordcloud/<version>/ with the most recently used ones kept in memory as bytes.
+    # At most max_files are kept on disk, the warmed (default) ones are never removed
+
+    def __init__(self, version, folder=None, max_entries=max_entries, max_files=max_files):
+        self.version = version
+        self.root = os.path.join(folder or cache_path, 'wordcloud')
+        self.folder = os.path.join(self.root, version)
+        self.max_entries = max_entries
+        self.max_files = max_files
+        self.keep = set()
+        self._png = OrderedDict()
+        self._layouts = OrderedDict()
+        self._pending = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def slug(selection):
+        category, first_year, last_year, genders = selection
+        return '{}_{}-{}_{}'.format(category.replace(' ', '_'), first_year, last_year, '-'.join(genders))
+
+    @staticmethod
+    def parse(slug):
+        # Selection of a slug, None when the slug is malformed
+        try:
+            category, years, genders = slug.rsplit('_', 2)
+            first_year, last_year = [int(year) for year in years.split('-')]
+        except ValueError:
+            return None
+        return category.replace('_', ' '), first_year, last_year, tuple(genders.split('-')) if genders else ()
+
+    def file_name(self, selection):
+        return os.path.join(self.folder, self.slug(selection) + '.png')
+
+    def url(self, selection):
+        return '/wordcloud/{}.png?v={}'.format(self.slug(selection), self.version)
+
+    def remember(self, entries, key, value):
+        with self._lock:
+            entries[key] = value
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def submit(self, selection, get_frequencies):
+        # Rendering in the pool, once per selection however many requests are waiting for it
+        with self._lock:
+            future = self._pending.get(selection)
+            if future is None:
+                frequencies = get_frequencies(selection)
+                key = layout_key(frequencies) if reuse_layout else None
+                future = submit_render(render_wordcloud_file, self.file_name(selection), frequencies,
+                                       self._layouts.get(key))
+                self._pending[selection] = future
+                future.add_done_callback(lambda future: self.rendered(selection, key, future))
+            return future
+
+    def rendered(self, selection, key, future):
+        with self._lock:
+            self._pending.pop(selection, None)
+            if future.exception() is None:
+                content, layout = future.result()
+                self.remember(self._png, selection, content)
+                if key is not None:
+                    self.remember(self._layouts, key, layout)
+        if future.exception() is None:
+            prune_files(self.root, self.max_files, self.keep)
+
+    def cached(self, selection):
+        # PNG of a selection that is already rendered, from memory or the shared disk cache, or None
+        content = self._png.get(selection)
+        if content is not None:
+            self.remember(self._png, selection, content)
+            return content
+        try:
+            with open(self.file_name(selection), 'rb') as f:
+                content = f.read()
+        except OSError:
+            return None
+        self.remember(self._png, selection, content)
+        return content
+
+    def png(self, selection, get_frequencies, timeout=None):
+        # The cached PNG, rendering only when there is none.
+        # None when the rendering takes longer than timeout seconds (it is kept once done) or fails
+        content = self.cached(selection)
+        if content is not None:
+            return content
+        try:
+            return self.submit(selection, get_frequencies).result(timeout)[0]
+        except TimeoutError:
+            return None
+        except Exception:
+            logger.warning('Word cloud %s could not be rendered', self.slug(selection), exc_info=True)
+            return None
+
+    def start(self, selection, get_frequencies):
+        # The cached PNG without waiting, or None after starting its rendering in the background
+        content = self.cached(selection)
+        if content is None:
+            try:
+                self.submit(selection, get_frequencies)
+            except Exception:
+                logger.warning('Word cloud %s could not be rendered', self.slug(selection), exc_info=True)
+        return content
+
+    def response(self, selection, request, fallback=None):
+        # Only rendered word clouds are served (renderings are started by the callback, not by image URLs).
+        # A missing one (e.g. removed from the disk) is answered with the fallback selection, which the
+        # browser does not keep, or with 404 Not Found
+        content = self.cached(selection)
+        if content is None:
+            content = self.cached(fallback) if fallback is not None else None
+            if content is None:
+                return Response(status=404, headers={'Cache-Control': fallback_cache_control})
+            response = Response(content, mimetype='image/png')
+            response.headers['Cache-Control'] = fallback_cache_control
+            return response
+        file_name = self.file_name(selection)
+        last_modified = os.path.getmtime(file_name) if os.path.exists(file_name) else time.time()
+        return cacheable_response(content, 'image/png', '{}-{}'.format(self.version, self.slug(selection)),
+                                  last_modified, request)
+
+    def carry_over(self, previous, categories):
+        # Reusing the renderings of another version for categories whose motivations have not changed
+        for selection, content in list(previous._png.items()):
+            if selection[0] in categories:
+                self.remember(self._png, selection, content)
+                if not os.path.exists(self.file_name(selection)):
+                    write_atomic(self.file_name(selection), content)
+
+    def warm(self, selections, get_frequencies, wait=True):
+        # Missing word clouds are rendered in parallel, and kept on disk whatever the number of files
+        self.keep.update(self.file_name(selection) for selection in selections)
+        for selection in selections:
+            if selection not in self._png and not os.path.exists(self.file_name(selection)):
+                self.submit(selection, get_frequencies)
+        if wait:
+            for selection in selections:
+                self.png(selection, get_frequencies)